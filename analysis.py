@@ -0,0 +1,326 @@
+import sqlite3
+import threading
+import wave
+
+import numpy as np
+
+from jobs import register_analyzer
+from settings import Analysis
+
+FEATURE_SIZE = 4 + 2 * Analysis.coefficients + 1
+EPSILON = 1e-10
+
+
+def decode_wav(file_path, max_seconds=Analysis.max_seconds):
+    """Чтение фрагмента из середины PCM WAV файла в виде моносигнала.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+        max_seconds (float): Максимальная длительность фрагмента в секундах.
+
+    Returns:
+        tuple[numpy.ndarray, int] | None: Отсчеты в диапазоне [-1, 1] и частота дискретизации
+            или None, если файл не является PCM WAV.
+    """
+    try:
+        with wave.open(file_path, "rb") as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.getnframes()
+            count = min(frames, int(max_seconds * rate))
+            wav.setpos((frames - count) // 2)
+            raw = wav.readframes(count)
+    except (wave.Error, EOFError, OSError):
+        return None
+
+    if width == 1:
+        samples = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, "<i2").astype(np.float32) / 32768
+    elif width == 3:
+        data = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        values = data[:, 0] | (data[:, 1] << 8) | (data[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(raw, "<i4").astype(np.float32) / 2147483648
+    else:
+        return None
+    samples = samples[: len(samples) - len(samples) % channels]
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+
+def mel_filters(rate, frame_size, bands):
+    """Построение треугольных фильтров, равномерно расположенных по мел-шкале.
+
+    Args:
+        rate (int): Частота дискретизации.
+        frame_size (int): Размер окна спектрального анализа.
+        bands (int): Количество полос.
+
+    Returns:
+        numpy.ndarray: Матрица фильтров размера (bands, frame_size // 2 + 1).
+    """
+    max_mel = 2595 * np.log10(1 + rate / 2 / 700)
+    hz_points = 700 * (10 ** (np.linspace(0, max_mel, bands + 2) / 2595) - 1)
+    freqs = np.fft.rfftfreq(frame_size, 1 / rate)
+    lower, center, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (freqs - lower) / np.maximum(center - lower, EPSILON)
+    falling = (upper - freqs) / np.maximum(upper - center, EPSILON)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def dct_matrix(coefficients, bands):
+    """Построение матрицы DCT-II для получения коэффициентов, похожих на MFCC.
+
+    Args:
+        coefficients (int): Количество коэффициентов.
+        bands (int): Количество мел-полос.
+
+    Returns:
+        numpy.ndarray: Матрица размера (coefficients, bands).
+    """
+    k = np.arange(coefficients)[:, None]
+    n = np.arange(bands)[None, :]
+    return np.cos(np.pi * k * (2 * n + 1) / (2 * bands)).astype(np.float32)
+
+
+def estimate_tempo(spectrum, rate, hop_size):
+    """Оценка темпа по автокорреляции огибающей спектрального потока.
+
+    Args:
+        spectrum (numpy.ndarray): Амплитудный спектр по окнам.
+        rate (int): Частота дискретизации.
+        hop_size (int): Шаг окна.
+
+    Returns:
+        float: Темп в ударах в минуту или 0, если фрагмент слишком короткий.
+    """
+    flux = np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)
+    flux -= flux.mean()
+    frames_per_second = rate / hop_size
+    min_lag = int(frames_per_second * 60 / 200)
+    max_lag = int(frames_per_second * 60 / 60)
+    if len(flux) <= max_lag:
+        return 0.0
+    size = 1 << int(2 * len(flux) - 1).bit_length()
+    spectrum_flux = np.fft.rfft(flux, size)
+    autocorrelation = np.fft.irfft(spectrum_flux * np.conj(spectrum_flux), size)[: len(flux)]
+    lag = min_lag + int(np.argmax(autocorrelation[min_lag : max_lag + 1]))
+    return 60 * frames_per_second / max(lag, 1)
+
+
+def compute_features(samples, rate):
+    """Вычисление вектора признаков аудиосигнала.
+
+    Вектор состоит из среднего и отклонения спектрального центроида и частоты спада (rolloff),
+    среднего и отклонения коэффициентов, похожих на MFCC, и темпа. Все вычисления векторизованы по окнам.
+
+    Args:
+        samples (numpy.ndarray): Моносигнал в диапазоне [-1, 1].
+        rate (int): Частота дискретизации.
+
+    Returns:
+        numpy.ndarray: Вектор признаков float32 длины 'FEATURE_SIZE'.
+    """
+    frame_size, hop_size = Analysis.frame_size, Analysis.hop_size
+    if len(samples) < frame_size:
+        samples = np.pad(samples, (0, frame_size - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame_size)[::hop_size]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_size).astype(np.float32), axis=1))
+    freqs = np.fft.rfftfreq(frame_size, 1 / rate)
+    nyquist = rate / 2
+
+    total = spectrum.sum(axis=1) + EPSILON
+    centroid = (spectrum @ freqs) / total / nyquist
+    rolloff_bins = (np.cumsum(spectrum, axis=1) < 0.85 * total[:, None]).sum(axis=1)
+    rolloff = freqs[np.minimum(rolloff_bins, len(freqs) - 1)] / nyquist
+
+    mel_energy = np.log(spectrum ** 2 @ mel_filters(rate, frame_size, Analysis.bands).T + EPSILON)
+    coefficients = mel_energy @ dct_matrix(Analysis.coefficients, Analysis.bands).T
+    tempo = estimate_tempo(spectrum, rate, hop_size)
+
+    return np.concatenate(
+        [
+            [centroid.mean(), centroid.std(), rolloff.mean(), rolloff.std()],
+            coefficients.mean(axis=0),
+            coefficients.std(axis=0),
+            [tempo / 200],
+        ]
+    ).astype(np.float32)
+
+
+def analyze_file(file_path):
+    """Вычисление упакованного вектора признаков аудиофайла.
+
+    Функция выполняется в отдельном процессе, поэтому принимает и возвращает только простые значения.
+    Поддерживаются PCM WAV файлы, так как для остальных форматов нет декодера без внешних зависимостей.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+
+    Returns:
+        bytes | None: Вектор признаков в виде упакованного массива float32 или None, если файл не удалось декодировать.
+    """
+    decoded = decode_wav(file_path)
+    if decoded is None:
+        return None
+    return compute_features(*decoded).tobytes()
+
+
+def is_analyzable(track):
+    """Проверка, нужно ли вычислять вектор признаков трека.
+
+    Args:
+        track (Track): Трек из общей библиотеки.
+
+    Returns:
+        bool: True, если трек в формате WAV и его вектора еще нет в индексе.
+    """
+    return track.path.lower().endswith(".wav") and not get_similarity_index().contains(track.id)
+
+
+def save_track_features(library, track, vector):
+    """Сохранение вектора признаков, вычисленного фоновой задачей.
+
+    Args:
+        library (Library): Общая библиотека треков.
+        track (Track): Трек, для которого вычислен вектор.
+        vector (bytes | None): Вектор признаков или None, если файл не удалось декодировать.
+    """
+    if vector is None:
+        return
+    library.save_features([(track.id, vector)])
+    get_similarity_index().add(track.id, vector)
+
+
+class SimilarityIndex:
+    """Индекс ближайших соседей по векторам признаков треков.
+
+    Векторы хранятся упакованными. При первом запросе после изменений из них собирается матрица,
+    признаки стандартизируются по библиотеке и нормируются, после чего похожие треки находятся
+    одним умножением матрицы на вектор по косинусной близости.
+    """
+    def __init__(self):
+        """Конструктор класса `SimilarityIndex`."""
+        self._vectors = {}
+        self._ids = None
+        self._positions = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def load(self, db_path="audio_history.db"):
+        """Метод загружает векторы признаков из таблицы 'track_features'.
+
+        Args:
+            db_path (str): Путь к файлу базы данных.
+        """
+        connection = sqlite3.connect(db_path)
+        cursor = connection.cursor()
+        cursor.execute("SELECT track_id, vector FROM track_features")
+        rows = cursor.fetchall()
+        connection.close()
+        with self._lock:
+            self._vectors = {
+                track_id: bytes(vector) for track_id, vector in rows
+                if len(vector) == FEATURE_SIZE * 4
+            }
+            self._matrix = None
+
+    def contains(self, track_id):
+        """Метод проверяет, есть ли вектор признаков трека в индексе.
+
+        Args:
+            track_id (int): Идентификатор трека.
+
+        Returns:
+            bool: True, если вектор есть.
+        """
+        return track_id in self._vectors
+
+    def add(self, track_id, vector):
+        """Метод добавляет или заменяет вектор признаков трека.
+
+        Args:
+            track_id (int): Идентификатор трека.
+            vector (bytes): Вектор признаков в виде упакованного массива float32.
+        """
+        with self._lock:
+            self._vectors[track_id] = vector
+            self._matrix = None
+
+    def remove(self, track_id):
+        """Метод удаляет вектор признаков трека.
+
+        Args:
+            track_id (int): Идентификатор трека.
+        """
+        with self._lock:
+            if self._vectors.pop(track_id, None) is not None:
+                self._matrix = None
+
+    def on_library_changed(self, event, tracks):
+        """Метод удаляет из индекса векторы удаленных из библиотеки треков.
+
+        Args:
+            event (str): Тип изменения библиотеки.
+            tracks (list[Track]): Затронутые треки.
+        """
+        if event == "deleted":
+            for track in tracks:
+                self.remove(track.id)
+
+    def _build(self):
+        self._ids = np.fromiter(self._vectors.keys(), dtype=np.int64, count=len(self._vectors))
+        self._positions = {int(track_id): position for position, track_id in enumerate(self._ids)}
+        matrix = np.frombuffer(b"".join(self._vectors.values()), dtype=np.float32)
+        matrix = matrix.reshape(len(self._ids), FEATURE_SIZE)
+        matrix = (matrix - matrix.mean(axis=0)) / (matrix.std(axis=0) + EPSILON)
+        self._matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + EPSILON)
+
+    def similar(self, track_id, limit=Analysis.similar_limit):
+        """Метод находит треки, наиболее похожие на указанный.
+
+        Args:
+            track_id (int): Идентификатор трека.
+            limit (int): Количество похожих треков.
+
+        Returns:
+            list[int]: Идентификаторы похожих треков по убыванию близости.
+        """
+        with self._lock:
+            if track_id not in self._vectors or len(self._vectors) < 2:
+                return []
+            if self._matrix is None:
+                self._build()
+            position = self._positions[track_id]
+            scores = self._matrix @ self._matrix[position]
+            scores[position] = -np.inf
+            limit = min(limit, len(scores) - 1)
+            nearest = np.argpartition(-scores, limit - 1)[:limit]
+            nearest = nearest[np.argsort(-scores[nearest])]
+            return [int(self._ids[position]) for position in nearest]
+
+
+_similarity_index = None
+_similarity_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Функция возвращает общий для всего процесса экземпляр `SimilarityIndex`.
+
+    При первом вызове векторы загружаются из базы данных.
+
+    Returns:
+        SimilarityIndex: Индекс похожих треков.
+    """
+    global _similarity_index
+    with _similarity_index_lock:
+        if _similarity_index is None:
+            _similarity_index = SimilarityIndex()
+            _similarity_index.load()
+        return _similarity_index
+
+
+register_analyzer("features", analyze_file, save_track_features, accepts=is_analyzable)
@@ -1,20 +1,53 @@
+import threading
+
 import flet as ft
 
+from analysis import get_similarity_index
 from db import init_db
+from health import start_scan
+from jobs import get_job_scheduler
+from library import get_library
 from player import AudioPlayer
+from stream_server import start_stream_server
 
 
 def main(page: ft.Page):
-    """Функция инициализирует базу данных, создает экземпляр класса 'AudioPlayer' и добавляет созданный интерфейс на страницу.
+    """Функция создает экземпляр класса 'AudioPlayer' и добавляет созданный интерфейс на страницу.
+
+    Все сессии используют общую библиотеку треков, при закрытии страницы плеер отписывается от её изменений
+    и сохраняет свое состояние. Интерфейс с восстановленным текущим треком отображается сразу, а библиотека
+    и списки треков загружаются в фоновом потоке, после чего списки прокручиваются к сохраненным позициям.
 
     Args:
         page (ft.Page): Страница Flet, на которой будет отображен интерфейс плеера.
     """
     page.title = "Flet Audio Player"
     page.theme_mode = "dark"
-    init_db()
-    player = AudioPlayer(page)
+    player = AudioPlayer(page, load_library=False)
+    page.on_disconnect = lambda _: player.close()
     page.add(player.main_panel)
     page.update()
 
-ft.app(target=main)
\ No newline at end of file
+    def load_library():
+        player.load_library()
+        player.restore_scroll_positions()
+
+    threading.Thread(target=load_library, daemon=True).start()
+
+
+def start_background_services():
+    """Функция загружает общую библиотеку треков и запускает очередь фоновых задач и проверку файлов."""
+    library = get_library()
+    library.subscribe(get_similarity_index().on_library_changed)
+    scheduler = get_job_scheduler()
+    scheduler.resume()
+    scheduler.enqueue_library("features")
+    scheduler.start()
+    start_scan(library)
+
+
+if __name__ == "__main__":
+    init_db()
+    start_stream_server(path_resolver=lambda track_id: get_library().get_track_path(track_id))
+    threading.Thread(target=start_background_services, daemon=True).start()
+    ft.app(target=main)
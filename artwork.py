@@ -0,0 +1,144 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+from tinytag import TinyTag
+
+from cache import ByteLRUCache
+from settings import Artwork
+
+
+def extract_cover(file_path):
+    """Извлечение встроенной обложки из аудиофайла.
+
+    Функция использует поддержку изображений библиотеки 'TinyTag'.
+    Поддерживаются как новый интерфейс ('images.any'), так и старый ('get_image').
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+
+    Returns:
+        bytes | None: Данные изображения или None, если обложки нет или файл не удалось прочитать.
+    """
+    try:
+        tag_info = TinyTag.get(file_path, image=True)
+    except Exception:
+        return None
+    if hasattr(tag_info, "images"):
+        image = tag_info.images.any
+        return image.data if image is not None else None
+    return tag_info.get_image()
+
+
+def make_thumbnail(data):
+    """Создание миниатюры обложки.
+
+    Изображение уменьшается до 'Artwork.thumbnail_size' по большей стороне. Если изображение не удалось разобрать, возвращаются исходные данные.
+
+    Args:
+        data (bytes): Исходные данные изображения.
+
+    Returns:
+        bytes: Данные миниатюры в формате JPEG или исходные данные.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((Artwork.thumbnail_size, Artwork.thumbnail_size))
+            output = io.BytesIO()
+            image.convert("RGB").save(output, format="JPEG", quality=85)
+            return output.getvalue()
+    except Exception:
+        return data
+
+
+class ArtworkStore:
+    """Класс для хранения миниатюр обложек.
+
+    Миниатюры хранятся на диске в файлах, названных по хэшу содержимого исходной обложки,
+    поэтому одна и та же обложка альбома сохраняется один раз. Перед дисковым кэшем находится
+    LRU-кэш в памяти, ограниченный по размеру в байтах.
+
+    Attributes:
+        cache_dir (str): Каталог дискового кэша.
+        memory_cache (ByteLRUCache): Кэш в памяти со строками base64, готовыми для 'ft.Image'.
+    """
+    def __init__(self, cache_dir=Artwork.cache_dir, memory_limit=Artwork.memory_limit):
+        """Конструктор класса `ArtworkStore`.
+
+        Args:
+            cache_dir (str): Каталог дискового кэша.
+            memory_limit (int): Лимит кэша в памяти в байтах.
+        """
+        self.cache_dir = cache_dir
+        self.memory_cache = ByteLRUCache(memory_limit)
+
+    def _path(self, cover_hash):
+        return os.path.join(self.cache_dir, cover_hash)
+
+    def save_cover(self, file_path):
+        """Метод извлекает обложку из аудиофайла и сохраняет её миниатюру в дисковый кэш.
+
+        Если миниатюра с таким хэшем уже есть, повторно она не создаётся.
+
+        Args:
+            file_path (str): Путь к аудиофайлу.
+
+        Returns:
+            str | None: Хэш обложки или None, если обложки нет.
+        """
+        data = extract_cover(file_path)
+        if not data:
+            return None
+        cover_hash = hashlib.sha1(data).hexdigest()
+        path = self._path(cover_hash)
+        if not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(make_thumbnail(data))
+            os.replace(temp_path, path)
+        return cover_hash
+
+    def get_base64(self, cover_hash):
+        """Метод возвращает миниатюру обложки в виде строки base64.
+
+        Сначала проверяется кэш в памяти, затем дисковый кэш. Теги аудиофайла при этом не читаются.
+
+        Args:
+            cover_hash (str): Хэш обложки.
+
+        Returns:
+            str | None: Строка base64 или None, если миниатюры нет в кэше.
+        """
+        if not cover_hash:
+            return None
+        encoded = self.memory_cache.get(cover_hash)
+        if encoded is not None:
+            return encoded
+        try:
+            with open(self._path(cover_hash), "rb") as file:
+                encoded = base64.b64encode(file.read()).decode("ascii")
+        except OSError:
+            return None
+        self.memory_cache.put(cover_hash, encoded)
+        return encoded
+
+
+_artwork_store = None
+_artwork_store_lock = threading.Lock()
+
+
+def get_artwork_store():
+    """Функция возвращает общий для всего процесса экземпляр `ArtworkStore`.
+
+    Returns:
+        ArtworkStore: Хранилище миниатюр обложек.
+    """
+    global _artwork_store
+    with _artwork_store_lock:
+        if _artwork_store is None:
+            _artwork_store = ArtworkStore()
+        return _artwork_store
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """Потокобезопасный LRU-кэш, ограниченный суммарным размером значений в байтах.
+
+    Используется для хранения в памяти обложек и других бинарных данных.
+    При превышении лимита вытесняются наименее давно использованные записи.
+
+    Attributes:
+        max_bytes (int): Максимальный суммарный размер значений в байтах.
+        current_bytes (int): Текущий суммарный размер значений в байтах.
+    """
+    def __init__(self, max_bytes):
+        """Конструктор класса `ByteLRUCache`.
+
+        Args:
+            max_bytes (int): Максимальный суммарный размер значений в байтах.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Метод возвращает значение по ключу и помечает его как недавно использованное.
+
+        Args:
+            key (Hashable): Ключ записи.
+
+        Returns:
+            bytes | str | None: Значение или None, если записи нет в кэше.
+        """
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Метод добавляет значение в кэш и вытесняет старые записи, если лимит превышен.
+
+        Значения, которые сами по себе больше лимита, в кэш не попадают.
+
+        Args:
+            key (Hashable): Ключ записи.
+            value (bytes | str): Значение, размер которого считается через len().
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old_value = self._items.pop(key, None)
+            if old_value is not None:
+                self.current_bytes -= len(old_value)
+            self._items[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
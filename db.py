@@ -1,24 +1,362 @@
+import json
+import re
 import sqlite3
+import unicodedata
 
+FACET_TABLES = {
+    "artist": ("artists", "artist_id"),
+    "album": ("albums", "album_id"),
+    "genre": ("genres", "genre_id"),
+}
 
-def init_db():
+SORT_KEY_COLUMNS = {"name": "name_key", "artist": "artist_key", "album": "album_key", "genre": "genre_key"}
+
+PATH_SEPARATOR_PATTERN = re.compile(r"[\\/]")
+
+AUDIO_HISTORY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT UNIQUE,
+        artist_id INTEGER,
+        album_id INTEGER,
+        genre_id INTEGER,
+        cover_hash TEXT,
+        status TEXT,
+        display_name TEXT,
+        name_key TEXT,
+        artist_key TEXT,
+        album_key TEXT,
+        genre_key TEXT,
+        FOREIGN KEY (artist_id) REFERENCES artists(id),
+        FOREIGN KEY (album_id) REFERENCES albums(id),
+        FOREIGN KEY (genre_id) REFERENCES genres(id)
+    )'''
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Добавление столбца в существующую таблицу, если его там ещё нет.
+
+    Нужна для обновления баз данных, созданных предыдущими версиями приложения.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+        table (str): Название таблицы.
+        column (str): Название столбца.
+        definition (str): Тип и ограничения столбца.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def make_display_name(path):
+    """Получение отображаемого названия трека из пути к файлу.
+
+    Путь разделяется и по прямой, и по обратной косой черте, поэтому названия одинаковы для путей Windows и Linux.
+
+    Args:
+        path (str): Путь к аудиофайлу.
+
+    Returns:
+        str: Имя файла без расширения в форме NFC.
+    """
+    filename = PATH_SEPARATOR_PATTERN.split(path)[-1]
+    stem, dot, _ = filename.rpartition(".")
+    return unicodedata.normalize("NFC", stem if dot and stem else filename)
+
+
+def make_sort_key(value):
+    """Получение ключа сортировки строки.
+
+    Ключ не зависит от регистра, от способа записи символов Unicode и от диакритических знаков
+    (NFKD без комбинируемых символов), поэтому "Ärger" и "Émile" сортируются рядом с "A" и "E", а не после "z".
+    Значения, которые отличаются только регистром или диакритическими знаками, имеют одинаковый ключ.
+
+    Args:
+        value (str | None): Строка.
+
+    Returns:
+        str: Ключ сортировки. Для отсутствующего значения возвращается пустая строка, поэтому такие треки идут первыми.
+    """
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKD", value.casefold())
+    return unicodedata.normalize("NFKC", "".join(char for char in folded if not unicodedata.combining(char)))
+
+
+def make_sort_keys(path, artist, album, genre):
+    """Получение отображаемого названия и ключей сортировки трека для записи в таблицу 'audio_history'.
+
+    Args:
+        path (str): Путь к аудиофайлу.
+        artist (str | None): Исполнитель.
+        album (str | None): Альбом.
+        genre (str | None): Жанр.
+
+    Returns:
+        tuple[str, str, str, str, str]: Отображаемое название и ключи сортировки по названию, исполнителю, альбому и жанру.
+    """
+    display_name = make_display_name(path)
+    return display_name, make_sort_key(display_name), make_sort_key(artist), make_sort_key(album), make_sort_key(genre)
+
+
+def refresh_sort_keys(cursor):
+    """Заполнение отображаемых названий и ключей сортировки у треков, исполнителей, альбомов и жанров, у которых их еще нет.
+
+    Нужна для баз данных и снимков, созданных предыдущими версиями приложения.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+    """
+    cursor.execute('''
+        SELECT audio_history.id, path, artists.name, albums.name, genres.name
+        FROM audio_history
+        LEFT JOIN artists ON artists.id = audio_history.artist_id
+        LEFT JOIN albums ON albums.id = audio_history.album_id
+        LEFT JOIN genres ON genres.id = audio_history.genre_id
+        WHERE display_name IS NULL''')
+    cursor.executemany(
+        "UPDATE audio_history SET display_name = ?, name_key = ?, artist_key = ?, album_key = ?, genre_key = ? "
+        "WHERE id = ?",
+        [(*make_sort_keys(*row[1:]), row[0]) for row in cursor.fetchall()],
+    )
+    for table, _ in FACET_TABLES.values():
+        cursor.execute(f"SELECT id, name FROM {table} WHERE sort_key IS NULL")
+        cursor.executemany(
+            f"UPDATE {table} SET sort_key = ? WHERE id = ?",
+            [(make_sort_key(name), facet_id) for facet_id, name in cursor.fetchall()],
+        )
+
+
+def normalize_facets(cursor):
+    """Перенос исполнителей, альбомов и жанров из текстовых столбцов 'audio_history' в отдельные таблицы.
+
+    Нужна для обновления баз данных, в которых таблица 'audio_history' хранит исполнителя, альбом и жанр
+    строками. Таблица пересоздается со ссылками на строки таблиц 'artists', 'albums' и 'genres',
+    идентификаторы треков сохраняются.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+    """
+    cursor.execute(
+        "INSERT OR IGNORE INTO artists (name) SELECT DISTINCT artist FROM audio_history WHERE artist IS NOT NULL"
+    )
+    cursor.execute('''
+        INSERT INTO albums (artist_id, name)
+        SELECT DISTINCT artists.id, audio_history.album
+        FROM audio_history LEFT JOIN artists ON artists.name = audio_history.artist
+        WHERE audio_history.album IS NOT NULL''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO genres (name) SELECT DISTINCT genre FROM audio_history WHERE genre IS NOT NULL"
+    )
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'audio_history'")
+    sequence = cursor.fetchone()
+    cursor.execute(AUDIO_HISTORY_SCHEMA.format(table="audio_history_normalized"))
+    cursor.execute('''
+        INSERT INTO audio_history_normalized (id, path, artist_id, album_id, genre_id, cover_hash, status)
+        SELECT audio_history.id, audio_history.path, artists.id, albums.id, genres.id,
+            audio_history.cover_hash, audio_history.status
+        FROM audio_history
+        LEFT JOIN artists ON artists.name = audio_history.artist
+        LEFT JOIN albums ON albums.artist_id IS artists.id AND albums.name = audio_history.album
+        LEFT JOIN genres ON genres.name = audio_history.genre''')
+    cursor.execute("DROP TABLE audio_history")
+    cursor.execute("ALTER TABLE audio_history_normalized RENAME TO audio_history")
+    if sequence is not None:
+        cursor.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'audio_history'", sequence)
+
+
+def refresh_facet_counts(cursor):
+    """Пересчет количества треков у исполнителей, альбомов и жанров.
+
+    Обычно счетчики поддерживают триггеры таблицы 'audio_history', пересчет нужен после переноса данных
+    и массовой загрузки с отключенными триггерами.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+    """
+    for table, column in FACET_TABLES.values():
+        cursor.execute(
+            f"UPDATE {table} SET track_count = (SELECT COUNT(*) FROM audio_history WHERE {column} = {table}.id)"
+        )
+
+
+def load_facet_ids(cursor):
+    """Загрузка идентификаторов исполнителей, альбомов и жанров.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+
+    Returns:
+        dict[str, dict]: Идентификаторы по названию для "artist" и "genre" и по паре
+            из идентификатора исполнителя и названия для "album".
+    """
+    cursor.execute("SELECT name, id FROM artists")
+    artists = dict(cursor.fetchall())
+    cursor.execute("SELECT artist_id, name, id FROM albums")
+    albums = {(artist_id, name): album_id for artist_id, name, album_id in cursor.fetchall()}
+    cursor.execute("SELECT name, id FROM genres")
+    genres = dict(cursor.fetchall())
+    return {"artist": artists, "album": albums, "genre": genres}
+
+
+def get_facet_ids(cursor, facet_ids, artist, album, genre):
+    """Получение идентификаторов исполнителя, альбома и жанра трека.
+
+    Значения, которых еще нет в таблицах 'artists', 'albums' и 'genres', добавляются в них.
+    Альбом определяется вместе с исполнителем, поэтому одноименные альбомы разных исполнителей различаются.
+
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных.
+        facet_ids (dict[str, dict]): Идентификаторы, загруженные функцией `load_facet_ids`. Дополняются новыми значениями.
+        artist (str | None): Исполнитель.
+        album (str | None): Альбом.
+        genre (str | None): Жанр.
+
+    Returns:
+        tuple[int | None, int | None, int | None]: Идентификаторы исполнителя, альбома и жанра.
+    """
+    artist_id = facet_ids["artist"].get(artist)
+    if artist_id is None and artist is not None:
+        cursor.execute("INSERT INTO artists (name, sort_key) VALUES (?, ?)", (artist, make_sort_key(artist)))
+        artist_id = facet_ids["artist"][artist] = cursor.lastrowid
+    album_id = facet_ids["album"].get((artist_id, album))
+    if album_id is None and album is not None:
+        cursor.execute(
+            "INSERT INTO albums (artist_id, name, sort_key) VALUES (?, ?, ?)", (artist_id, album, make_sort_key(album))
+        )
+        album_id = facet_ids["album"][(artist_id, album)] = cursor.lastrowid
+    genre_id = facet_ids["genre"].get(genre)
+    if genre_id is None and genre is not None:
+        cursor.execute("INSERT INTO genres (name, sort_key) VALUES (?, ?)", (genre, make_sort_key(genre)))
+        genre_id = facet_ids["genre"][genre] = cursor.lastrowid
+    return artist_id, album_id, genre_id
+
+
+def read_session_state(client_id, db_path="audio_history.db"):
+    """Чтение сохраненного состояния плеера вместе с путем к файлу текущего трека.
+
+    Выполняется один запрос по первичному ключу, поэтому состояние можно восстановить до загрузки библиотеки треков.
+
+    Args:
+        client_id (str): Идентификатор клиента.
+        db_path (str): Путь к файлу базы данных.
+
+    Returns:
+        tuple[dict, str | None]: Состояние или пустой словарь, если оно еще не сохранялось,
+            и путь к файлу текущего трека или None, если трека нет в библиотеке.
+    """
+    connection = sqlite3.connect(db_path)
+    try:
+        row = connection.execute('''
+            SELECT session_state.state, audio_history.path
+            FROM session_state
+            LEFT JOIN audio_history ON audio_history.id = json_extract(session_state.state, '$.track_id')
+            WHERE session_state.client_id = ?''', (client_id,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return {}, None
+    return json.loads(row[0]), row[1]
+
+
+def init_db(db_path="audio_history.db"):
     """Инициализация базы данных для хранения истории воспроизведения аудиофайлов и плейлистов.
     
-    Эта функция создает три таблицы в базе данных SQLite: audio_history', 'playlists_history' и 'playlist_tracks'.
-    Таблица 'audio_history' хранит информацию о треках, включая путь к файлу, исполнителя, альбом и жанр.
+    Эта функция создает таблицы в базе данных SQLite: 'artists', 'albums', 'genres', 'audio_history', 'playlists_history', 'playlist_tracks', 'jobs', 'session_state', 'track_plays' и 'track_features'.
+    Таблицы 'artists', 'albums' и 'genres' хранят исполнителей, альбомы и жанры вместе с количеством треков.
+    Таблица 'audio_history' хранит информацию о треках, включая путь к файлу, ссылки на исполнителя, альбом и жанр, хэш обложки, результат проверки доступности файла,
+    отображаемое название и ключи сортировки, которые вычисляются один раз при добавлении трека.
     Таблица 'playlists_history' хранит названия созданных плейлистов.
     Таблица 'playlist_tracks' связывает треки с плейлистами.
+    Таблица 'jobs' хранит очередь фоновых задач обработки треков с их состоянием, количеством попыток и приоритетом.
+    Таблица 'session_state' хранит состояние плеера каждого клиента для восстановления при следующем запуске.
+    Таблица 'track_plays' хранит количество воспроизведений треков.
+    Таблица 'track_features' хранит векторы аудиопризнаков треков в виде упакованных массивов float32.
+
+    Args:
+        db_path (str): Путь к файлу базы данных.
     """
-    conn = sqlite3.connect('audio_history.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS audio_history (
+        CREATE TABLE IF NOT EXISTS artists (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            path TEXT UNIQUE,
-            artist TEXT,
-            album TEXT,
-            genre TEXT  
+            name TEXT UNIQUE,
+            sort_key TEXT,
+            track_count INTEGER NOT NULL DEFAULT 0
         )''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS albums (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            artist_id INTEGER,
+            name TEXT,
+            sort_key TEXT,
+            track_count INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (artist_id, name),
+            FOREIGN KEY (artist_id) REFERENCES artists(id)
+        )''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS genres (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            sort_key TEXT,
+            track_count INTEGER NOT NULL DEFAULT 0
+        )''')
+    cursor.execute("PRAGMA table_info(audio_history)")
+    legacy = "artist" in [row[1] for row in cursor.fetchall()]
+    if legacy:
+        add_column_if_missing(cursor, "audio_history", "cover_hash", "TEXT")
+        add_column_if_missing(cursor, "audio_history", "status", "TEXT")
+        normalize_facets(cursor)
+    cursor.execute(AUDIO_HISTORY_SCHEMA.format(table="audio_history"))
+    for column in ("display_name", *SORT_KEY_COLUMNS.values()):
+        add_column_if_missing(cursor, "audio_history", column, "TEXT")
+    for table, _ in FACET_TABLES.values():
+        add_column_if_missing(cursor, table, "sort_key", "TEXT")
+    refresh_sort_keys(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS audio_history_artist ON audio_history (artist_id, album_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS audio_history_album ON audio_history (album_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS audio_history_genre ON audio_history (genre_id)")
+    # Сортировка списка треков читает идентификаторы прямо из этих индексов, без сортировки строк при запросе.
+    # Треки с одинаковым ключом идут в порядке идентификаторов, которые и так хранятся в каждой записи индекса.
+    for column, key in SORT_KEY_COLUMNS.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS audio_history_{column}_sort ON audio_history ({key})")
+    cursor.execute("CREATE INDEX IF NOT EXISTS artists_sort ON artists (sort_key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS albums_sort ON albums (artist_id, sort_key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS genres_sort ON genres (sort_key)")
+    # Счетчики треков поддерживаются триггерами, поэтому списки исполнителей, альбомов и жанров
+    # с количеством треков читаются без группировки всей таблицы 'audio_history'.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audio_history_facets_insert AFTER INSERT ON audio_history BEGIN
+            UPDATE artists SET track_count = track_count + 1 WHERE id = NEW.artist_id;
+            UPDATE albums SET track_count = track_count + 1 WHERE id = NEW.album_id;
+            UPDATE genres SET track_count = track_count + 1 WHERE id = NEW.genre_id;
+        END''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audio_history_facets_delete AFTER DELETE ON audio_history BEGIN
+            UPDATE artists SET track_count = track_count - 1 WHERE id = OLD.artist_id;
+            UPDATE albums SET track_count = track_count - 1 WHERE id = OLD.album_id;
+            UPDATE genres SET track_count = track_count - 1 WHERE id = OLD.genre_id;
+        END''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS audio_history_facets_update
+        AFTER UPDATE OF artist_id, album_id, genre_id ON audio_history BEGIN
+            UPDATE artists SET track_count = track_count - 1
+                WHERE id = OLD.artist_id AND OLD.artist_id IS NOT NEW.artist_id;
+            UPDATE artists SET track_count = track_count + 1
+                WHERE id = NEW.artist_id AND OLD.artist_id IS NOT NEW.artist_id;
+            UPDATE albums SET track_count = track_count - 1
+                WHERE id = OLD.album_id AND OLD.album_id IS NOT NEW.album_id;
+            UPDATE albums SET track_count = track_count + 1
+                WHERE id = NEW.album_id AND OLD.album_id IS NOT NEW.album_id;
+            UPDATE genres SET track_count = track_count - 1
+                WHERE id = OLD.genre_id AND OLD.genre_id IS NOT NEW.genre_id;
+            UPDATE genres SET track_count = track_count + 1
+                WHERE id = NEW.genre_id AND OLD.genre_id IS NOT NEW.genre_id;
+        END''')
+    if legacy:
+        refresh_facet_counts(cursor)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS playlists_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -32,5 +370,36 @@ def init_db():
             FOREIGN KEY (playlist_id) REFERENCES playlists_history(id),
             FOREIGN KEY (track_id) REFERENCES audio_history(id)
         )''') 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL,
+            track_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            priority INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            UNIQUE (job_type, track_id),
+            FOREIGN KEY (track_id) REFERENCES audio_history(id)
+        )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS jobs_track ON jobs (track_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS session_state (
+            client_id TEXT PRIMARY KEY,
+            state TEXT
+        )''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS track_plays (
+            track_id INTEGER PRIMARY KEY,
+            play_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (track_id) REFERENCES audio_history(id)
+        )''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS track_features (
+            track_id INTEGER PRIMARY KEY,
+            vector BLOB,
+            FOREIGN KEY (track_id) REFERENCES audio_history(id)
+        )''')
     conn.commit()
     conn.close()
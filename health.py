@@ -0,0 +1,106 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from tinytag import TinyTag
+
+from settings import Health
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"
+STATUS_UNREADABLE = "unreadable"
+STATUS_UNPARSEABLE = "unparseable"
+BROKEN_STATUSES = {STATUS_MISSING, STATUS_UNREADABLE, STATUS_UNPARSEABLE}
+
+
+def check_file(file_path):
+    """Проверка доступности аудиофайла.
+
+    Файл проверяется на существование, на возможность чтения и на то, что 'TinyTag' может разобрать его теги.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+
+    Returns:
+        str: Один из статусов 'STATUS_OK', 'STATUS_MISSING', 'STATUS_UNREADABLE' или 'STATUS_UNPARSEABLE'.
+    """
+    if not os.path.isfile(file_path):
+        return STATUS_MISSING
+    try:
+        with open(file_path, "rb") as file:
+            file.read(1)
+    except OSError:
+        return STATUS_UNREADABLE
+    try:
+        TinyTag.get(file_path)
+    except Exception:
+        return STATUS_UNPARSEABLE
+    return STATUS_OK
+
+
+def is_broken(track):
+    """Проверка, отмечен ли трек как недоступный по результатам последней проверки.
+
+    Args:
+        track (Track): Трек из общей библиотеки.
+
+    Returns:
+        bool: True, если файл трека отсутствует, не читается или не разбирается.
+    """
+    return track.status in BROKEN_STATUSES
+
+
+def scan_library(library, max_workers=Health.max_workers, batch_size=Health.batch_size):
+    """Проверка доступности файлов всех треков библиотеки.
+
+    Файлы проверяются параллельно в пуле потоков: проверка в основном состоит из обращений к диску,
+    во время которых потоки не держат GIL. Результаты записываются в базу данных пакетами,
+    а сессии получают уведомления только о треках, у которых изменился статус.
+
+    Args:
+        library (Library): Общая библиотека треков.
+        max_workers (int): Количество потоков проверки.
+        batch_size (int): Количество результатов в одном пакете записи.
+
+    Returns:
+        int: Количество треков, у которых изменился статус.
+    """
+    tracks = library.all_tracks()
+    changed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        statuses = zip(
+            (track.id for track in tracks),
+            pool.map(check_file, (track.path for track in tracks)),
+        )
+        while True:
+            batch = list(islice(statuses, batch_size))
+            if not batch:
+                break
+            changed += len(library.update_statuses(batch))
+    return changed
+
+
+_scan_lock = threading.Lock()
+
+
+def start_scan(library):
+    """Функция запускает проверку библиотеки в фоновом потоке, если она еще не выполняется.
+
+    Args:
+        library (Library): Общая библиотека треков.
+
+    Returns:
+        bool: True, если проверка запущена.
+    """
+    if not _scan_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            scan_library(library)
+        finally:
+            _scan_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from library import get_library
+from settings import Jobs
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+PRIORITY_BACKGROUND = 0
+PRIORITY_VISIBLE = 10
+PRIORITY_PLAYING = 20
+
+Analyzer = namedtuple("Analyzer", ["work", "save", "accepts"])
+Analyzer.__doc__ = """Обработчик задач одного типа, зарегистрированный функцией `register_analyzer`."""
+
+_analyzers = {}
+
+
+def register_analyzer(job_type, work, save, accepts=None):
+    """Регистрация обработчика фоновых задач.
+
+    Args:
+        job_type (str): Тип задач, например "features".
+        work (Callable[[str], Any]): Функция, которая получает путь к аудиофайлу и возвращает результат.
+            Выполняется в отдельном процессе, поэтому должна быть функцией уровня модуля и возвращать простые значения.
+        save (Callable[[Library, Track, Any], None]): Функция, которая сохраняет результат. Выполняется в основном процессе.
+        accepts (Callable[[Track], bool] | None): Функция, которая проверяет, нужна ли задача для трека.
+            По умолчанию задача ставится для всех треков.
+    """
+    _analyzers[job_type] = Analyzer(work, save, accepts)
+
+
+def get_analyzer(job_type):
+    """Получение зарегистрированного обработчика задач.
+
+    Args:
+        job_type (str): Тип задач.
+
+    Returns:
+        Analyzer | None: Обработчик или None, если он не зарегистрирован.
+    """
+    return _analyzers.get(job_type)
+
+
+class JobScheduler:
+    """Очередь фоновых задач обработки треков, сохраняемая в таблице 'jobs'.
+
+    Задачи выполняются в пуле процессов. Одновременно выполняется не больше задач, чем процессов в пуле,
+    поэтому повышение приоритета видимых и текущего треков действует уже на следующую задачу.
+    Состояние каждой задачи записывается в базу данных: выполненные задачи не повторяются после перезапуска,
+    а задачи, которые выполнялись при аварийном завершении, возвращаются в очередь методом `resume`.
+
+    Attributes:
+        library (Library): Общая библиотека треков.
+        max_workers (int | None): Количество процессов.
+        max_attempts (int): Количество попыток выполнить задачу.
+    """
+    def __init__(self, library, db_path="audio_history.db", max_workers=Jobs.max_workers, max_attempts=Jobs.max_attempts):
+        """Конструктор класса `JobScheduler`.
+
+        Args:
+            library (Library): Общая библиотека треков.
+            db_path (str): Путь к файлу базы данных.
+            max_workers (int | None): Количество процессов.
+            max_attempts (int): Количество попыток выполнить задачу.
+        """
+        self.library = library
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._boosts = OrderedDict()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def close(self):
+        """Метод останавливает выполнение задач и закрывает соединение с базой данных."""
+        self.stop()
+        with self._lock:
+            self._connection.close()
+
+    def resume(self):
+        """Метод возвращает в очередь задачи, которые выполнялись при предыдущем завершении приложения.
+
+        Returns:
+            int: Количество возвращенных задач.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ? WHERE status = ?", (STATUS_PENDING, STATUS_RUNNING)
+            )
+            self._connection.commit()
+            return cursor.rowcount
+
+    def enqueue(self, job_type, tracks, priority=PRIORITY_BACKGROUND):
+        """Метод ставит задачи для треков в очередь.
+
+        Задачи, которые уже выполнены или стоят в очереди, повторно не создаются, у ожидающих задач
+        только повышается приоритет. Треки, для которых обработчик не нужен, пропускаются.
+
+        Args:
+            job_type (str): Тип задач.
+            tracks (Iterable[Track]): Треки.
+            priority (int): Приоритет задач.
+
+        Returns:
+            int: Количество треков, для которых задача создана или обновлена.
+
+        Raises:
+            ValueError: Если обработчик для типа задач не зарегистрирован.
+        """
+        analyzer = get_analyzer(job_type)
+        if analyzer is None:
+            raise ValueError(f"Неизвестный тип задач: {job_type}")
+        rows = [
+            (job_type, track.id, priority) for track in tracks
+            if analyzer.accepts is None or analyzer.accepts(track)
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            self._connection.executemany(
+                "INSERT INTO jobs (job_type, track_id, priority) VALUES (?, ?, ?) "
+                "ON CONFLICT (job_type, track_id) DO UPDATE SET priority = max(priority, excluded.priority) "
+                f"WHERE status = '{STATUS_PENDING}'",
+                rows,
+            )
+            self._connection.commit()
+        self._wake.set()
+        return len(rows)
+
+    def enqueue_library(self, job_type):
+        """Метод ставит в очередь задачи для всех треков библиотеки с фоновым приоритетом.
+
+        Args:
+            job_type (str): Тип задач.
+
+        Returns:
+            int: Количество треков, для которых нужна задача.
+        """
+        return self.enqueue(job_type, self.library.all_tracks())
+
+    def boost(self, track_ids, priority):
+        """Метод временно повышает приоритет задач треков, например видимых в списке или текущего.
+
+        Повышение хранится только в памяти для последних 'Jobs.max_boosts' треков и не записывается в базу данных,
+        поэтому прокрутка списка не приводит к записи в базу данных.
+
+        Args:
+            track_ids (Iterable[int]): Идентификаторы треков.
+            priority (int): Приоритет.
+        """
+        with self._lock:
+            for track_id in track_ids:
+                self._boosts.pop(track_id, None)
+                self._boosts[track_id] = priority
+            while len(self._boosts) > Jobs.max_boosts:
+                self._boosts.popitem(last=False)
+        self._wake.set()
+
+    def counts(self):
+        """Метод возвращает количество задач по типам и состояниям.
+
+        Returns:
+            dict[tuple[str, str], int]: Количество задач по паре из типа и состояния.
+        """
+        with self._lock:
+            cursor = self._connection.execute("SELECT job_type, status, COUNT(*) FROM jobs GROUP BY job_type, status")
+            return {(job_type, status): count for job_type, status, count in cursor.fetchall()}
+
+    def _claim(self, limit):
+        if limit <= 0:
+            return []
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute(
+                "SELECT id, job_type, track_id, priority FROM jobs WHERE status = ? ORDER BY priority DESC, id LIMIT ?",
+                (STATUS_PENDING, limit),
+            )
+            candidates = {job[0]: job for job in cursor.fetchall()}
+            if self._boosts:
+                cursor.execute(
+                    "SELECT id, job_type, track_id, priority FROM jobs "
+                    "WHERE status = ? AND track_id IN (SELECT value FROM json_each(?))",
+                    (STATUS_PENDING, json.dumps(list(self._boosts))),
+                )
+                candidates.update(
+                    (job_id, (job_id, job_type, track_id, max(priority, self._boosts[track_id])))
+                    for job_id, job_type, track_id, priority in cursor.fetchall()
+                )
+            jobs = [job[:3] for job in sorted(candidates.values(), key=lambda job: (-job[3], job[0]))[:limit]]
+            cursor.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1 WHERE id = ?",
+                [(STATUS_RUNNING, job[0]) for job in jobs],
+            )
+            self._connection.commit()
+            for _, _, track_id in jobs:
+                self._boosts.pop(track_id, None)
+            return jobs
+
+    def _set_status(self, job_id, status, error=None):
+        with self._lock:
+            if status == STATUS_PENDING:
+                cursor = self._connection.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ? WHERE id = ?",
+                    (self.max_attempts, STATUS_FAILED, STATUS_PENDING, error, job_id),
+                )
+            else:
+                cursor = self._connection.execute(
+                    "UPDATE jobs SET status = ?, error = ? WHERE id = ?", (status, error, job_id)
+                )
+            self._connection.commit()
+            return cursor.rowcount
+
+    def _submit(self, pool, job):
+        job_id, job_type, track_id = job
+        track = self.library.get_track(track_id)
+        analyzer = get_analyzer(job_type)
+        if track is None:
+            with self._lock:
+                self._connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self._connection.commit()
+            return None
+        if analyzer is None:
+            self._set_status(job_id, STATUS_FAILED, f"Неизвестный тип задач: {job_type}")
+            return None
+        return pool.submit(analyzer.work, track.path)
+
+    def _finish(self, job, future):
+        job_id, job_type, track_id = job
+        try:
+            result = future.result()
+            track = self.library.get_track(track_id)
+            if track is not None:
+                get_analyzer(job_type).save(self.library, track, result)
+        except Exception as error:
+            self._set_status(job_id, STATUS_PENDING, f"{type(error).__name__}: {error}")
+        else:
+            self._set_status(job_id, STATUS_DONE)
+
+    def run(self, stop_when_idle=False):
+        """Метод выполняет задачи из очереди, пока не будет вызван `stop`.
+
+        Args:
+            stop_when_idle (bool): Завершить работу, когда в очереди не останется задач.
+        """
+        slots = self.max_workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=slots)
+        in_flight = {}
+        try:
+            while not self._stopped.is_set():
+                for job in self._claim(slots - len(in_flight)):
+                    future = self._submit(pool, job)
+                    if future is not None:
+                        in_flight[future] = job
+                if not in_flight:
+                    if stop_when_idle:
+                        return
+                    self._wake.wait(Jobs.poll_interval)
+                    self._wake.clear()
+                    continue
+                done, _ = wait(in_flight, timeout=Jobs.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(in_flight.pop(future), future)
+        finally:
+            # Незавершенные задачи остаются в состоянии "running" и возвращаются в очередь при следующем запуске.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Метод запускает выполнение задач в фоновом потоке."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Метод останавливает выполнение задач."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_job_scheduler = None
+_job_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler():
+    """Функция возвращает общий для всего процесса экземпляр `JobScheduler`.
+
+    Returns:
+        JobScheduler: Очередь фоновых задач.
+    """
+    global _job_scheduler
+    with _job_scheduler_lock:
+        if _job_scheduler is None:
+            _job_scheduler = JobScheduler(get_library())
+        return _job_scheduler
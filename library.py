@@ -0,0 +1,491 @@
+import json
+import sqlite3
+import threading
+import weakref
+from collections import namedtuple
+
+from db import FACET_TABLES, SORT_KEY_COLUMNS, get_facet_ids, load_facet_ids, make_sort_keys
+from search_index import TrigramIndex
+from settings import Search
+
+Track = namedtuple(
+    "Track",
+    ["id", "path", "artist", "album", "genre", "cover_hash", "status", "display_name"],
+    defaults=(None, None, None),
+)
+Track.__doc__ = """Неизменяемая запись о треке из таблицы 'audio_history'."""
+
+Facet = namedtuple("Facet", ["id", "name", "track_count"])
+Facet.__doc__ = """Исполнитель, альбом или жанр вместе с количеством треков."""
+
+
+class Library:
+    """Общая для всех сессий библиотека треков.
+
+    Класс хранит в памяти один индекс треков из таблицы 'audio_history' и является единственным, кто изменяет эту таблицу.
+    Сессии подписываются на изменения и получают уведомления о добавленных, удаленных и измененных треках,
+    поэтому им не нужно перечитывать библиотеку из базы данных и хранить собственную копию строк.
+
+    Attributes:
+        db_path (str): Путь к файлу базы данных.
+        tracks (dict[int, Track]): Треки по идентификатору в порядке добавления.
+        search_index (TrigramIndex): Триграммный индекс для поиска по мере ввода.
+        play_counts (dict[int, int]): Количество воспроизведений треков, которые воспроизводились хотя бы раз.
+    """
+    def __init__(self, db_path="audio_history.db"):
+        """Конструктор класса `Library`.
+
+        Args:
+            db_path (str): Путь к файлу базы данных.
+        """
+        self.db_path = db_path
+        self.tracks = {}
+        self.search_index = TrigramIndex()
+        self.play_counts = {}
+        self._track_ids_by_path = {}
+        self._facet_ids = {}
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.load()
+
+    def load(self):
+        """Метод загружает все треки из базы данных в индекс в памяти и строит поисковый индекс."""
+        with self._lock:
+            cursor = self._connection.cursor()
+            self._facet_ids = load_facet_ids(cursor)
+            cursor.execute('''
+                SELECT audio_history.id, path, artists.name, albums.name, genres.name, cover_hash, status, display_name
+                FROM audio_history
+                LEFT JOIN artists ON artists.id = audio_history.artist_id
+                LEFT JOIN albums ON albums.id = audio_history.album_id
+                LEFT JOIN genres ON genres.id = audio_history.genre_id
+                ORDER BY audio_history.id''')
+            self.tracks = {row[0]: Track(*row) for row in cursor.fetchall()}
+            self._track_ids_by_path = {track.path: track.id for track in self.tracks.values()}
+            self.search_index = TrigramIndex()
+            for track in self.tracks.values():
+                self.search_index.add_track(track)
+            cursor.execute("SELECT track_id, play_count FROM track_plays")
+            self.play_counts = dict(cursor.fetchall())
+
+    def close(self):
+        """Метод закрывает соединение с базой данных."""
+        with self._lock:
+            self._connection.close()
+
+    def all_tracks(self):
+        """Метод возвращает список всех треков в порядке добавления.
+
+        Returns:
+            list[Track]: Треки библиотеки.
+        """
+        with self._lock:
+            return list(self.tracks.values())
+
+    def max_track_id(self):
+        """Метод возвращает наибольший идентификатор трека.
+
+        Треки хранятся в порядке добавления, а идентификаторы возрастают, поэтому последний трек имеет наибольший идентификатор.
+
+        Returns:
+            int: Идентификатор или 0, если библиотека пуста.
+        """
+        with self._lock:
+            return next(reversed(self.tracks), 0)
+
+    def search(self, text, limit=Search.limit):
+        """Метод ищет треки, у которых имя файла, исполнитель, альбом или жанр похожи на указанную строку.
+
+        Поиск выполняется по триграммному индексу, поэтому находит значения с опечатками.
+
+        Args:
+            text (str): Строка поиска.
+            limit (int): Максимальное количество найденных треков.
+
+        Returns:
+            list[Track]: Найденные треки по убыванию сходства.
+        """
+        with self._lock:
+            return [self.tracks[track_id] for track_id in self.search_index.search(text, limit)]
+
+    def sorted_tracks(self, column):
+        """Метод возвращает треки, отсортированные по значению указанного столбца, а при равных значениях — в порядке добавления.
+
+        Порядок читается из индекса по ключам сортировки, которые вычисляются при добавлении трека,
+        поэтому ни строки, ни треки при запросе не сортируются.
+
+        Args:
+            column (str): Название столбца: "name", "artist", "album" или "genre".
+
+        Returns:
+            list[Track]: Отсортированные треки.
+
+        Raises:
+            ValueError: Если передан неизвестный столбец.
+        """
+        if column not in SORT_KEY_COLUMNS:
+            raise ValueError(f"Неизвестный столбец сортировки: {column}")
+        with self._lock:
+            cursor = self._connection.execute(f"SELECT id FROM audio_history ORDER BY {SORT_KEY_COLUMNS[column]}, id")
+            return [self.tracks[track_id] for (track_id,) in cursor.fetchall() if track_id in self.tracks]
+
+    def list_facets(self, facet, artist_id=None):
+        """Метод возвращает исполнителей, альбомы или жанры, у которых есть треки.
+
+        Количество треков читается из счетчиков, которые поддерживают триггеры базы данных. Значения упорядочены
+        по ключу сортировки `make_sort_key`, как и треки в `sorted_tracks`.
+
+        Args:
+            facet (str): "artist", "album" или "genre".
+            artist_id (int | None): Идентификатор исполнителя, альбомы которого нужно вернуть. Только для альбомов.
+
+        Returns:
+            list[Facet]: Значения по алфавиту.
+
+        Raises:
+            ValueError: Если передан неизвестный вид значений.
+        """
+        if facet not in FACET_TABLES:
+            raise ValueError(f"Неизвестный вид значений: {facet}")
+        table = FACET_TABLES[facet][0]
+        sql = f"SELECT id, name, track_count FROM {table} WHERE track_count > 0"
+        parameters = ()
+        if facet == "album" and artist_id is not None:
+            sql += " AND artist_id = ?"
+            parameters = (artist_id,)
+        with self._lock:
+            cursor = self._connection.execute(sql + " ORDER BY sort_key, id", parameters)
+            return [Facet(*row) for row in cursor.fetchall()]
+
+    def facet_tracks(self, facet, facet_id):
+        """Метод возвращает треки исполнителя, альбома или жанра.
+
+        Треки выбираются по индексу таблицы 'audio_history', а не перебором всей библиотеки.
+
+        Args:
+            facet (str): "artist", "album" или "genre".
+            facet_id (int): Идентификатор исполнителя, альбома или жанра.
+
+        Returns:
+            list[Track]: Треки в порядке добавления, у исполнителя — сгруппированные по альбомам.
+
+        Raises:
+            ValueError: Если передан неизвестный вид значений.
+        """
+        if facet not in FACET_TABLES:
+            raise ValueError(f"Неизвестный вид значений: {facet}")
+        column = FACET_TABLES[facet][1]
+        order = "album_id, id" if facet == "artist" else "id"
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT id FROM audio_history WHERE {column} = ? ORDER BY {order}", (facet_id,)
+            )
+            return [self.tracks[track_id] for (track_id,) in cursor.fetchall() if track_id in self.tracks]
+
+    def get_track(self, track_id):
+        """Метод возвращает трек по идентификатору.
+
+        Args:
+            track_id (int): Идентификатор трека.
+
+        Returns:
+            Track | None: Трек или None, если его нет в библиотеке.
+        """
+        return self.tracks.get(track_id)
+
+    def get_track_by_path(self, path):
+        """Метод возвращает трек по пути к файлу.
+
+        Args:
+            path (str): Путь к аудиофайлу.
+
+        Returns:
+            Track | None: Трек или None, если его нет в библиотеке.
+        """
+        track_id = self._track_ids_by_path.get(path)
+        return self.tracks.get(track_id) if track_id is not None else None
+
+    def get_track_path(self, track_id):
+        """Метод возвращает путь к файлу трека по идентификатору.
+
+        Args:
+            track_id (int): Идентификатор трека.
+
+        Returns:
+            str | None: Путь к аудиофайлу или None, если трека нет в библиотеке.
+        """
+        track = self.tracks.get(track_id)
+        return track.path if track else None
+
+    def add_track(self, path, artist, album, genre, cover_hash=None):
+        """Метод добавляет трек в таблицу 'audio_history' и в индекс в памяти.
+
+        Args:
+            path (str): Путь к аудиофайлу.
+            artist (str): Исполнитель.
+            album (str): Альбом.
+            genre (str): Жанр.
+            cover_hash (str | None): Хэш обложки.
+
+        Returns:
+            Track | None: Добавленный трек или None, если трек с таким путем уже есть.
+        """
+        with self._lock:
+            if path in self._track_ids_by_path:
+                return None
+            cursor = self._connection.cursor()
+            facet_ids = get_facet_ids(cursor, self._facet_ids, artist, album, genre)
+            sort_keys = make_sort_keys(path, artist, album, genre)
+            cursor.execute(
+                "INSERT OR IGNORE INTO audio_history (path, artist_id, album_id, genre_id, cover_hash, "
+                "display_name, name_key, artist_key, album_key, genre_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, *facet_ids, cover_hash, *sort_keys),
+            )
+            self._connection.commit()
+            if not cursor.rowcount:
+                return None
+            track = Track(cursor.lastrowid, path, artist, album, genre, cover_hash, display_name=sort_keys[0])
+            self.tracks[track.id] = track
+            self._track_ids_by_path[path] = track.id
+            self.search_index.add_track(track)
+        self._notify("added", [track])
+        return track
+
+    def delete_track(self, track_id):
+        """Метод удаляет трек из таблиц 'audio_history', 'playlist_tracks', 'track_features', 'track_plays' и 'jobs' и из индекса в памяти.
+
+        Args:
+            track_id (int): Идентификатор трека.
+        """
+        with self._lock:
+            track = self.tracks.pop(track_id, None)
+            if track is None:
+                return
+            self._track_ids_by_path.pop(track.path, None)
+            self.search_index.remove_track(track)
+            self.play_counts.pop(track_id, None)
+            cursor = self._connection.cursor()
+            cursor.execute("DELETE FROM audio_history WHERE id = ?", (track_id,))
+            cursor.execute("DELETE FROM playlist_tracks WHERE track_id = ?", (track_id,))
+            cursor.execute("DELETE FROM track_features WHERE track_id = ?", (track_id,))
+            cursor.execute("DELETE FROM jobs WHERE track_id = ?", (track_id,))
+            cursor.execute("DELETE FROM track_plays WHERE track_id = ?", (track_id,))
+            self._connection.commit()
+        self._notify("deleted", [track])
+
+    def update_track(self, track_id, artist, album, genre):
+        """Метод изменяет исполнителя, альбом и жанр трека.
+
+        Args:
+            track_id (int): Идентификатор трека.
+            artist (str): Исполнитель.
+            album (str): Альбом.
+            genre (str): Жанр.
+        """
+        self.update_tracks([track_id], artist=artist, album=album, genre=genre)
+
+    def update_tracks(self, track_ids, **fields):
+        """Метод изменяет исполнителя, альбом, жанр и (или) обложку сразу у нескольких треков.
+
+        Все треки изменяются одним пакетным запросом UPDATE в одной транзакции, после чего индекс в памяти
+        и поисковый индекс обновляются только для этих треков, а сессии получают одно уведомление.
+
+        Args:
+            track_ids (Iterable[int]): Идентификаторы треков.
+            **fields (str): Новые значения полей "artist", "album", "genre" и "cover_hash". Не переданные поля не меняются.
+
+        Returns:
+            list[Track]: Измененные треки.
+
+        Raises:
+            ValueError: Если передано поле, которое нельзя изменять.
+        """
+        unknown_fields = set(fields) - {"artist", "album", "genre", "cover_hash"}
+        if unknown_fields:
+            raise ValueError(f"Нельзя изменить поля: {', '.join(sorted(unknown_fields))}")
+        with self._lock:
+            old_tracks = [self.tracks[track_id] for track_id in dict.fromkeys(track_ids) if track_id in self.tracks]
+            if not old_tracks or not fields:
+                return []
+            tracks = [old_track._replace(**fields) for old_track in old_tracks]
+            cursor = self._connection.cursor()
+            # Альбом ссылается на исполнителя, поэтому идентификаторы определяются для каждого трека отдельно.
+            cursor.executemany(
+                "UPDATE audio_history SET artist_id = ?, album_id = ?, genre_id = ?, cover_hash = ?, "
+                "artist_key = ?, album_key = ?, genre_key = ? WHERE id = ?",
+                [
+                    (
+                        *get_facet_ids(cursor, self._facet_ids, track.artist, track.album, track.genre),
+                        track.cover_hash,
+                        *make_sort_keys(track.path, track.artist, track.album, track.genre)[2:],
+                        track.id,
+                    )
+                    for track in tracks
+                ],
+            )
+            self._connection.commit()
+            for old_track, track in zip(old_tracks, tracks):
+                self.tracks[track.id] = track
+                self.search_index.update_track(old_track, track)
+        self._notify("updated", tracks)
+        return tracks
+
+    def update_statuses(self, statuses):
+        """Метод сохраняет результаты проверки доступности файлов треков.
+
+        В базу данных записываются только изменившиеся статусы, одной транзакцией.
+
+        Args:
+            statuses (list[tuple[int, str]]): Пары из идентификатора трека и статуса.
+
+        Returns:
+            list[Track]: Треки, у которых изменился статус.
+        """
+        with self._lock:
+            tracks = [
+                self.tracks[track_id]._replace(status=status)
+                for track_id, status in statuses
+                if track_id in self.tracks and self.tracks[track_id].status != status
+            ]
+            if not tracks:
+                return []
+            self._connection.executemany(
+                "UPDATE audio_history SET status = ? WHERE id = ?",
+                [(track.status, track.id) for track in tracks],
+            )
+            self._connection.commit()
+            for track in tracks:
+                self.tracks[track.id] = track
+        self._notify("updated", tracks)
+        return tracks
+
+    def save_features(self, features):
+        """Метод сохраняет векторы аудиопризнаков треков в таблицу 'track_features' одной транзакцией.
+
+        Args:
+            features (list[tuple[int, bytes]]): Пары из идентификатора трека и упакованного вектора признаков.
+        """
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO track_features (track_id, vector) VALUES (?, ?)",
+                features,
+            )
+            self._connection.commit()
+
+    def record_play(self, track_id):
+        """Метод увеличивает количество воспроизведений трека.
+
+        Args:
+            track_id (int): Идентификатор трека.
+        """
+        with self._lock:
+            if track_id not in self.tracks:
+                return
+            self.play_counts[track_id] = self.play_counts.get(track_id, 0) + 1
+            self._connection.execute(
+                "INSERT INTO track_plays (track_id, play_count) VALUES (?, 1) "
+                "ON CONFLICT (track_id) DO UPDATE SET play_count = play_count + 1",
+                (track_id,),
+            )
+            self._connection.commit()
+
+    def play_count(self, track_id):
+        """Метод возвращает количество воспроизведений трека.
+
+        Args:
+            track_id (int): Идентификатор трека.
+
+        Returns:
+            int: Количество воспроизведений.
+        """
+        return self.play_counts.get(track_id, 0)
+
+    def load_session_state(self, client_id):
+        """Метод возвращает сохраненное состояние плеера клиента.
+
+        Args:
+            client_id (str): Идентификатор клиента.
+
+        Returns:
+            dict: Состояние, переданное в `save_session_state`, или пустой словарь, если оно еще не сохранялось.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state FROM session_state WHERE client_id = ?", (client_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_session_state(self, client_id, state):
+        """Метод сохраняет состояние плеера клиента в таблицу 'session_state' одной записью.
+
+        У каждого клиента своя запись, поэтому одновременные сессии веб-версии не перезаписывают состояние друг друга.
+
+        Args:
+            client_id (str): Идентификатор клиента.
+            state (dict): Состояние, которое можно записать в JSON.
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO session_state (client_id, state) VALUES (?, ?)",
+                (client_id, json.dumps(state)),
+            )
+            self._connection.commit()
+
+    def subscribe(self, callback):
+        """Метод подписывает обработчик на изменения библиотеки.
+
+        Для методов объектов хранится слабая ссылка, поэтому закрытые сессии не удерживаются в памяти.
+
+        Args:
+            callback (Callable[[str, list[Track]], None]): Обработчик, который получает тип изменения
+                ("added", "deleted" или "updated") и список затронутых треков.
+        """
+        if hasattr(callback, "__self__"):
+            reference = weakref.WeakMethod(callback)
+        else:
+            reference = lambda: callback
+        with self._lock:
+            self._subscribers.append(reference)
+
+    def unsubscribe(self, callback):
+        """Метод отписывает обработчик от изменений библиотеки.
+
+        Args:
+            callback (Callable[[str, list[Track]], None]): Обработчик, переданный в `subscribe`.
+        """
+        with self._lock:
+            self._subscribers = [
+                reference for reference in self._subscribers
+                if reference() is not None and reference() != callback
+            ]
+
+    def _notify(self, event, tracks):
+        with self._lock:
+            self._subscribers = [reference for reference in self._subscribers if reference() is not None]
+            callbacks = [reference() for reference in self._subscribers]
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(event, tracks)
+            except Exception:
+                # Ошибка в одной сессии, например закрытой странице, не должна мешать остальным.
+                pass
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library():
+    """Функция возвращает общий для всего процесса экземпляр `Library`.
+
+    Returns:
+        Library: Библиотека треков.
+    """
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = Library()
+        return _library
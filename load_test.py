@@ -0,0 +1,372 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from unittest.mock import MagicMock
+
+from db import init_db
+from jobs import JobScheduler
+from library import Library
+from player import AudioPlayer
+
+OPERATION_WEIGHTS = {
+    "search": 40,
+    "sort": 5,
+    "create_playlist": 5,
+    "add_to_playlist": 15,
+    "remove_from_playlist": 10,
+    "import": 15,
+    "delete": 10,
+}
+SORT_COLUMNS = ("artist", "album", "genre")
+DEFAULT_SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "music", "silent-wood.mp3")
+
+
+def percentile(values, fraction):
+    """Вычисление перцентиля методом ближайшего ранга.
+
+    Args:
+        values (list[float]): Отсортированные значения.
+        fraction (float): Доля от 0 до 1, например 0.99 для p99.
+
+    Returns:
+        float: Значение перцентиля или 0, если значений нет.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, min(len(values), math.ceil(fraction * len(values))))
+    return values[rank - 1]
+
+
+class LoadSession:
+    """Одна имитируемая сессия плеера со страницей-заглушкой.
+
+    Сессия выполняет случайные действия пользователя через обработчики `AudioPlayer` и записывает
+    время выполнения каждого обработчика.
+
+    Attributes:
+        player (AudioPlayer): Плеер сессии.
+        latencies (dict[str, list[float]]): Время выполнения обработчиков по видам действий в секундах.
+        locked (Counter): Количество ошибок 'database is locked' по видам действий.
+        errors (Counter): Количество остальных ошибок по видам действий и типам исключений.
+    """
+    def __init__(self, number, library, scheduler, sample_path, rng):
+        """Конструктор класса `LoadSession`.
+
+        Args:
+            number (int): Номер сессии.
+            library (Library): Библиотека треков, общая для всех сессий.
+            scheduler (JobScheduler): Очередь фоновых задач, общая для всех сессий.
+            sample_path (str): Аудиофайл, копии которого импортируются.
+            rng (random.Random): Генератор случайных чисел сессии.
+        """
+        self.number = number
+        self.library = library
+        self.sample_path = sample_path
+        self.rng = rng
+        self.player = AudioPlayer(MagicMock(), library=library, scheduler=scheduler)
+        # Страница сессии — заглушка, поэтому плеер не добавлен на нее и обновлять элемент воспроизведения не нужно.
+        self.player.current_track.update = lambda: None
+        self.imported_paths = []
+        self.import_count = 0
+        self.latencies = defaultdict(list)
+        self.locked = Counter()
+        self.errors = Counter()
+
+    def random_track(self):
+        """Метод возвращает случайный трек библиотеки или None, если она пуста."""
+        tracks = self.library.all_tracks()
+        return self.rng.choice(tracks) if tracks else None
+
+    def random_playlist(self):
+        """Метод возвращает название случайного плейлиста сессии или None, если их нет."""
+        names = [control.text for control in self.player.playlist_list.controls]
+        return self.rng.choice(names) if names else None
+
+    def search(self):
+        """Поиск по началу исполнителя или пути случайного трека."""
+        track = self.random_track()
+        term = (track.artist or track.path) if track else "track"
+        self.player.search_bar.value = term[: self.rng.randint(1, max(1, len(term)))]
+        self.player.search_by_metadata(None)
+
+    def sort(self):
+        """Сортировка списка всех треков по случайному столбцу."""
+        self.player.sort_by_column(self.rng.choice(SORT_COLUMNS))
+
+    def create_playlist(self):
+        """Создание плейлиста."""
+        self.player.create_playlist(None)
+
+    def add_to_playlist(self):
+        """Добавление случайного трека в случайный плейлист."""
+        track = self.random_track()
+        self.player.current_playlist = self.random_playlist()
+        self.player.current_track_path = track.path if track else None
+        self.player.add_to_playlist(None)
+
+    def remove_from_playlist(self):
+        """Удаление случайного трека из случайного плейлиста."""
+        track = self.random_track()
+        self.player.current_playlist = self.random_playlist()
+        self.player.current_track_path = track.path if track else None
+        self.player.remove_from_playlist(None)
+
+    def import_track(self):
+        """Импорт копии аудиофайла через обработчик выбора файла. Время копирования файла не учитывается."""
+        self.import_count += 1
+        extension = os.path.splitext(self.sample_path)[1]
+        path = os.path.abspath(os.path.join("imports", f"{self.number}_{self.import_count}{extension}"))
+        shutil.copyfile(self.sample_path, path)
+        started = time.perf_counter()
+        self.player.add_new_track(MagicMock(files=[MagicMock(path=path)]))
+        elapsed = time.perf_counter() - started
+        if self.library.get_track_by_path(path) is not None:
+            self.imported_paths.append(path)
+        return elapsed
+
+    def delete(self):
+        """Удаление одного из треков, импортированных этой сессией."""
+        if not self.imported_paths:
+            return
+        self.player.current_track_path = self.imported_paths.pop(self.rng.randrange(len(self.imported_paths)))
+        self.player.delete_track(None)
+
+    def run_operation(self, name):
+        """Метод выполняет одно действие и записывает время его выполнения.
+
+        Args:
+            name (str): Вид действия из 'OPERATION_WEIGHTS'.
+        """
+        handler = {
+            "search": self.search,
+            "sort": self.sort,
+            "create_playlist": self.create_playlist,
+            "add_to_playlist": self.add_to_playlist,
+            "remove_from_playlist": self.remove_from_playlist,
+            "import": self.import_track,
+            "delete": self.delete,
+        }[name]
+        started = time.perf_counter()
+        try:
+            elapsed = handler()
+        except sqlite3.OperationalError as error:
+            if "locked" in str(error):
+                self.locked[name] += 1
+            else:
+                self.errors[f"{name}: {type(error).__name__}"] += 1
+            return
+        except Exception as error:
+            self.errors[f"{name}: {type(error).__name__}"] += 1
+            return
+        self.latencies[name].append(elapsed if elapsed is not None else time.perf_counter() - started)
+
+    def run(self, operations, barrier):
+        """Метод выполняет заданное количество случайных действий.
+
+        Args:
+            operations (int): Количество действий.
+            barrier (threading.Barrier): Барьер, чтобы все сессии начинали нагрузку одновременно.
+        """
+        names = list(OPERATION_WEIGHTS)
+        weights = list(OPERATION_WEIGHTS.values())
+        barrier.wait()
+        for name in self.rng.choices(names, weights, k=operations):
+            self.run_operation(name)
+
+    def close(self):
+        """Метод закрывает плеер сессии без ожидания отложенного сохранения состояния."""
+        if self.player.session_timer is not None:
+            self.player.session_timer.cancel()
+        self.library.unsubscribe(self.player.on_library_changed)
+
+
+def seed_tracks(library, count, rng):
+    """Добавление в библиотеку вымышленных треков, чтобы в ней было не меньше указанного количества.
+
+    Args:
+        library (Library): Библиотека треков.
+        count (int): Минимальное количество треков.
+        rng (random.Random): Генератор случайных чисел.
+    """
+    for number in range(len(library.tracks), count):
+        library.add_track(
+            f"/load_test/track_{number}.mp3",
+            f"Artist {rng.randrange(max(1, count // 20))}",
+            f"Album {rng.randrange(max(1, count // 10))}",
+            f"Genre {rng.randrange(20)}",
+        )
+
+
+def run_sessions(sessions, operations, tracks, sample_path, seed):
+    """Выполнение нагрузочной проверки в текущем каталоге.
+
+    Библиотека и очередь задач создаются явно и передаются в `AudioPlayer`, поэтому общие для процесса экземпляры
+    не создаются и в память сессий не попадает вторая библиотека. Очередь задач не запускается: сессии только
+    ставят в нее задачи и повышают их приоритет.
+
+    Args:
+        sessions (int): Количество одновременных сессий.
+        operations (int): Количество действий в каждой сессии.
+        tracks (int): Минимальное количество треков в библиотеке.
+        sample_path (str): Аудиофайл, копии которого импортируются.
+        seed (int): Начальное значение генератора случайных чисел.
+
+    Returns:
+        dict: Результат в формате `run_load_test`.
+    """
+    init_db()
+    os.makedirs("imports", exist_ok=True)
+    rng = random.Random(seed)
+    library = Library()
+    scheduler = JobScheduler(library)
+    load_sessions = []
+    try:
+        seed_tracks(library, tracks, rng)
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        for number in range(sessions):
+            load_sessions.append(LoadSession(number, library, scheduler, sample_path, random.Random(rng.random())))
+        memory_per_session = (tracemalloc.get_traced_memory()[0] - memory_before) / max(1, sessions)
+        tracemalloc.stop()
+
+        barrier = threading.Barrier(sessions + 1)
+        threads = [
+            threading.Thread(target=session.run, args=(operations, barrier), daemon=True)
+            for session in load_sessions
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        latencies = defaultdict(list)
+        locked = Counter()
+        errors = Counter()
+        for session in load_sessions:
+            for name, values in session.latencies.items():
+                latencies[name].extend(values)
+            locked.update(session.locked)
+            errors.update(session.errors)
+        return {
+            "latencies": {name: sorted(values) for name, values in latencies.items()},
+            "locked": dict(locked),
+            "errors": dict(errors),
+            "memory_per_session": memory_per_session,
+            "duration": duration,
+        }
+    finally:
+        for session in load_sessions:
+            session.close()
+        scheduler.close()
+        library.close()
+
+
+def run_load_test(
+    db_path="audio_history.db", sessions=30, operations=50, tracks=1000, sample_path=DEFAULT_SAMPLE, seed=0
+):
+    """Нагрузочная проверка нескольких одновременных сессий плеера.
+
+    Копия базы данных создается во временном каталоге, поэтому исходная база не изменяется.
+    Проверка выполняется функцией `run_sessions` в отдельном процессе с рабочим каталогом во временном каталоге,
+    поэтому текущий каталог и общие для процесса экземпляры вызывающего процесса не изменяются.
+    Все сессии работают с одной библиотекой, как сессии веб-версии, и выполняют в отдельных потоках
+    поиск, сортировку, изменение плейлистов, импорт и удаление треков через обработчики `AudioPlayer`.
+
+    Args:
+        db_path (str): Путь к базе данных, копия которой используется в проверке. Если файла нет, создается пустая база.
+        sessions (int): Количество одновременных сессий.
+        operations (int): Количество действий в каждой сессии.
+        tracks (int): Минимальное количество треков в библиотеке. Недостающие треки добавляются перед проверкой.
+        sample_path (str): Аудиофайл, копии которого импортируются.
+        seed (int): Начальное значение генератора случайных чисел.
+
+    Returns:
+        dict: Время выполнения обработчиков по видам действий ('latencies', в секундах, по возрастанию),
+            количество ошибок 'database is locked' ('locked') и остальных ошибок ('errors'),
+            память на одну сессию ('memory_per_session', в байтах) и общее время нагрузки ('duration', в секундах).
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if os.path.exists(db_path):
+            source = sqlite3.connect(db_path)
+            copy = sqlite3.connect(os.path.join(temp_dir, "audio_history.db"))
+            source.backup(copy)
+            source.close()
+            copy.close()
+        result = subprocess.run(
+            [
+                sys.executable, os.path.abspath(__file__), "--worker",
+                "--sessions", str(sessions), "--operations", str(operations), "--tracks", str(tracks),
+                "--sample", os.path.abspath(sample_path), "--seed", str(seed),
+            ],
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def format_report(report):
+    """Форматирование результатов нагрузочной проверки в таблицу.
+
+    Args:
+        report (dict): Результат функции `run_load_test`.
+
+    Returns:
+        str: Текст отчета.
+    """
+    lines = [f"{'Действие':<22}{'Кол-во':>8}{'p50, мс':>10}{'p99, мс':>10}{'locked':>8}"]
+    all_latencies = []
+    for name in OPERATION_WEIGHTS:
+        values = report["latencies"].get(name, [])
+        all_latencies.extend(values)
+        lines.append(
+            f"{name:<22}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}"
+            f"{percentile(values, 0.99) * 1000:>10.1f}{report['locked'].get(name, 0):>8}"
+        )
+    all_latencies.sort()
+    lines.append(
+        f"{'всего':<22}{len(all_latencies):>8}{percentile(all_latencies, 0.5) * 1000:>10.1f}"
+        f"{percentile(all_latencies, 0.99) * 1000:>10.1f}{sum(report['locked'].values()):>8}"
+    )
+    lines.append(f"Время нагрузки: {report['duration']:.2f} с")
+    lines.append(f"Память на сессию: {report['memory_per_session'] / 1024:.0f} КБ")
+    for error, count in sorted(report["errors"].items()):
+        lines.append(f"Ошибка {error}: {count}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка одновременных сессий аудиоплеера.")
+    parser.add_argument("--db", default="audio_history.db", help="База данных, копия которой используется в проверке")
+    parser.add_argument("--sessions", type=int, default=30, help="Количество одновременных сессий")
+    parser.add_argument("--operations", type=int, default=50, help="Количество действий в каждой сессии")
+    parser.add_argument("--tracks", type=int, default=1000, help="Минимальное количество треков в библиотеке")
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE, help="Аудиофайл, копии которого импортируются")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение генератора случайных чисел")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        print(json.dumps(run_sessions(
+            arguments.sessions, arguments.operations, arguments.tracks, arguments.sample, arguments.seed
+        )))
+    else:
+        print(format_report(run_load_test(
+            arguments.db, arguments.sessions, arguments.operations, arguments.tracks, arguments.sample, arguments.seed
+        )))
@@ -0,0 +1,55 @@
+from tinytag import TinyTag
+
+from artwork import get_artwork_store
+from jobs import register_analyzer
+
+UNKNOWN_METADATA = {"artist": "Unknown Artist", "album": "Unknown Album", "genre": "Unknown Genre"}
+
+
+def get_metadata(file_path):
+    """Получение метаданных аудиофайла.
+
+    Функция использует библиотеку 'TinyTag' для извлечения метаданных аудиофайла, таких как исполнитель, альбом и жанр.
+    Если извлечение метаданных невозможно, возвращаются значения по умолчанию.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+
+    Returns:
+        dict: Словарь с ключами 'artist', 'album' и 'genre'.
+    """
+    metadata = {}
+    tag_info = TinyTag.get(file_path)
+    metadata["artist"] = tag_info.artist or UNKNOWN_METADATA["artist"]
+    metadata["album"] = tag_info.album or UNKNOWN_METADATA["album"]
+    metadata["genre"] = tag_info.genre or UNKNOWN_METADATA["genre"]
+    return metadata
+
+
+def read_track_metadata(file_path):
+    """Чтение метаданных и сохранение обложки аудиофайла в фоновой задаче.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+
+    Returns:
+        dict: Словарь с ключами 'artist', 'album', 'genre' и 'cover_hash'.
+    """
+    metadata = get_metadata(file_path)
+    metadata["cover_hash"] = get_artwork_store().save_cover(file_path)
+    return metadata
+
+
+def save_track_metadata(library, track, metadata):
+    """Сохранение метаданных, прочитанных фоновой задачей, если они отличаются от сохраненных.
+
+    Args:
+        library (Library): Общая библиотека треков.
+        track (Track): Трек, метаданные которого прочитаны.
+        metadata (dict): Результат функции `read_track_metadata`.
+    """
+    if any(getattr(track, field) != value for field, value in metadata.items()):
+        library.update_tracks([track.id], **metadata)
+
+
+register_analyzer("metadata", read_track_metadata, save_track_metadata)
@@ -1,28 +1,23 @@
+import os
+
 import flet as ft
-from tinytag import TinyTag
 import sqlite3
+import threading
+import uuid
 
-from settings import Colors
-
-
-def get_metadata(file_path):
-    """Получение метаданных аудиофайла.
-
-    Функция использует библиотеку 'TinyTag' для извлечения метаданных аудиофайла, таких как исполнитель, альбом и жанр.
-    Если извлечение метаданных невозможно, возвращаются значения по умолчанию.
-
-    Args:
-        file_path (str): Путь к аудиофайлу.
+from analysis import analyze_file, get_similarity_index, save_track_features
+from artwork import get_artwork_store
+from db import read_session_state
+from health import STATUS_MISSING, is_broken, start_scan
+from jobs import PRIORITY_PLAYING, PRIORITY_VISIBLE, get_job_scheduler
+from library import get_library
+from metadata import UNKNOWN_METADATA
+from preview import get_preview_store
+from settings import Artwork, Colors, Preview, Search, Session
+from shuffle import MODE_AVOID_SAME_ARTIST, MODE_FAVOR_UNPLAYED, MODE_RANDOM, Shuffler
+from stream_server import track_url
 
-    Returns:
-        dict: Словарь с ключами 'artist', 'album' и 'genre'.
-    """
-    metadata = {}
-    tag_info = TinyTag.get(file_path)
-    metadata["artist"] = tag_info.artist or "Unknown Artist"
-    metadata["album"] = tag_info.album or "Unknown Album"
-    metadata["genre"] = tag_info.genre or "Unknown Genre"
-    return metadata
+CLIENT_ID_KEY = "audio_player.client_id"
 
 
 class AudioPlayer:
@@ -34,18 +29,198 @@ class AudioPlayer:
     Attributes:
         page (flet.Page): Объект страницы Flet, на которой будет отображаться интерфейс плеера.
     """
-    def __init__(self, page):
+    def __init__(self, page, library=None, scheduler=None, load_library=True, db_path="audio_history.db"):
         """Конструктор класса `AudioPlayer`.
         
         Инициализирует объект плеера, создавая необходимые элементы управления и загружая данные из базы данных.
+        Состояние предыдущей сессии читается одним запросом до загрузки библиотеки треков. Если 'load_library'
+        равен False, библиотека и списки загружаются позже методом `load_library`, поэтому интерфейс можно
+        отобразить и продолжить воспроизведение, не дожидаясь загрузки всех треков.
 
         Args:
             page (flet.Page): Объект страницы Flet, на которой будет отображаться интерфейс плеера.
+            library (Library | None): Библиотека треков. По умолчанию используется общая библиотека процесса.
+            scheduler (JobScheduler | None): Очередь фоновых задач. По умолчанию используется общая очередь процесса.
+            load_library (bool): Загрузить библиотеку и списки треков сразу.
+            db_path (str): Путь к файлу базы данных, если библиотека не передана.
         """
         self.page = page
+        self.library = library
+        self.scheduler = scheduler
+        self.db_path = library.db_path if library is not None else db_path
+        self.client_id = self.get_client_id()
         self.create_control_elements()
+        self.restore_session_state()
+        if load_library:
+            self.load_library()
+
+    def get_client_id(self):
+        """Метод возвращает идентификатор клиента, под которым сохраняется состояние плеера.
+
+        Идентификатор хранится в 'client_storage' страницы, то есть в настройках приложения или в браузере,
+        поэтому у каждого клиента веб-версии свое состояние, которое восстанавливается при следующем подключении.
+
+        Returns:
+            str: Идентификатор клиента.
+        """
+        client_id = self.page.client_storage.get(CLIENT_ID_KEY)
+        if not isinstance(client_id, str):
+            client_id = uuid.uuid4().hex
+            self.page.client_storage.set(CLIENT_ID_KEY, client_id)
+        return client_id
+
+    def load_library(self):
+        """Метод загружает библиотеку треков, заполняет списки треков и плейлистов и подписывает плеер на изменения библиотеки."""
+        if self.library is None:
+            self.library = get_library()
+            self.db_path = self.library.db_path
+        if self.scheduler is None:
+            self.scheduler = get_job_scheduler()
         self.load_tracks_from_db()
         self.load_playlists_from_db()
+        if self.current_playlist:
+            self.open_playlist(self.current_playlist)
+        self.update_metadata_list()
+        self.library.subscribe(self.on_library_changed)
+
+    def close(self):
+        """Метод отписывает плеер от изменений общей библиотеки и сохраняет состояние при закрытии сессии."""
+        if self.session_timer is not None:
+            self.session_timer.cancel()
+        if self.library is None:
+            return
+        self.library.unsubscribe(self.on_library_changed)
+        self.save_session_state()
+
+    def restore_session_state(self):
+        """Метод восстанавливает текущий трек, позицию, скорость, громкость, открытый плейлист, сортировку, прокрутку списков и случайный порядок.
+
+        Состояние и путь к текущему треку читаются одним запросом, библиотека треков для этого не нужна.
+        Трек только выбирается для воспроизведения, позиция устанавливается после его загрузки в `on_track_loaded`.
+        """
+        state, track_path = read_session_state(self.client_id, self.db_path)
+        self.current_track.playback_rate = state.get("playback_rate", self.current_track.playback_rate)
+        self.current_track.volume = state.get("volume", self.current_track.volume)
+        self.current_playlist = state.get("playlist")
+        self.sort_column = state.get("sort_column")
+        self.scroll_offsets.update(state.get("scroll_offsets", {}))
+        self.shuffle_enabled = state.get("shuffle", False)
+        self.shuffle_mode_list.value = state.get("shuffle_mode", MODE_RANDOM)
+        self.shuffle_button.icon = ft.Icons.SHUFFLE_ON if self.shuffle_enabled else ft.Icons.SHUFFLE
+        if track_path is not None and os.path.isfile(track_path):
+            self.current_track_source = state.get("source")
+            self.current_track_path = track_path
+            self.current_track.src = track_url(state["track_id"]) or track_path
+            self.current_position = self.pending_seek = state.get("position", 0)
+
+    def restore_scroll_positions(self):
+        """Метод прокручивает списки треков к сохраненным позициям.
+
+        Вызывается после добавления интерфейса на страницу, потому что прокручивать можно только отображенный список.
+        """
+        for list_name, offset in self.scroll_offsets.items():
+            if offset:
+                getattr(self, list_name).scroll_to(offset=offset, duration=0)
+
+    def collect_session_state(self):
+        """Метод собирает состояние плеера, которое сохраняется между запусками.
+
+        Returns:
+            dict: Идентификатор текущего трека, позиция в миллисекундах, скорость, громкость, открытый плейлист,
+                столбец сортировки, позиции прокрутки списков и режим случайного порядка.
+        """
+        track = self.library.get_track_by_path(self.current_track_path)
+        return {
+            "track_id": track.id if track else None,
+            "source": self.current_track_source,
+            "position": self.current_position,
+            "playback_rate": self.current_track.playback_rate,
+            "volume": self.current_track.volume,
+            "playlist": self.current_playlist,
+            "sort_column": self.sort_column,
+            "scroll_offsets": self.scroll_offsets,
+            "shuffle": self.shuffle_enabled,
+            "shuffle_mode": self.shuffle_mode_list.value,
+        }
+
+    def schedule_session_save(self):
+        """Метод откладывает сохранение состояния плеера.
+
+        Изменения, сделанные до срабатывания таймера, записываются вместе, поэтому частые события,
+        например изменение позиции воспроизведения, не приводят к записи в базу данных на каждое событие.
+        """
+        if self.session_timer is None or not self.session_timer.is_alive():
+            self.session_timer = threading.Timer(Session.save_delay, self.save_session_state)
+            self.session_timer.daemon = True
+            self.session_timer.start()
+
+    def save_session_state(self):
+        """Метод сохраняет состояние плеера в общую библиотеку, если она уже загружена."""
+        if self.library is not None:
+            self.library.save_session_state(self.client_id, self.collect_session_state())
+
+    def on_library_changed(self, event, tracks):
+        """Метод обновляет списки треков этой сессии при изменении общей библиотеки.
+
+        Изменяются только строки затронутых треков, списки целиком не перестраиваются.
+
+        Args:
+            event (str): Тип изменения: "added", "deleted" или "updated".
+            tracks (list[Track]): Затронутые треки.
+        """
+        track_ids = {track.id: track for track in tracks}
+        if event == "added":
+            for track in tracks:
+                self.all_tracks_list.controls.append(
+                    self.create_track_button(track, "all_tracks_list")
+                )
+            self.load_visible_artwork("all_tracks_list")
+        elif event == "deleted":
+            for list_view in (self.all_tracks_list, self.current_track_list):
+                list_view.controls = [
+                    control for control in list_view.controls
+                    if control.data.id not in track_ids
+                ]
+            self.selected_track_ids -= track_ids.keys()
+            self.reset_playlist_shuffle()
+        elif event == "updated":
+            # Текст строк не зависит от метаданных, поэтому обновляются только данные, стиль,
+            # видимость и обложка затронутых строк и поля метаданных.
+            changed_controls = []
+            facets_changed = False
+            covers_changed = False
+            for list_view in (self.all_tracks_list, self.current_track_list):
+                for control in list_view.controls:
+                    if control.data.id in track_ids:
+                        track = track_ids[control.data.id]
+                        old_facets = (control.data.artist, control.data.album, control.data.genre)
+                        facets_changed |= old_facets != (track.artist, track.album, track.genre)
+                        if control.data.cover_hash != track.cover_hash and control.content is not None:
+                            control.content = None
+                            changed_controls.append(control)
+                        covers_changed |= control.data.cover_hash != track.cover_hash
+                        control.data = track
+                        style = self.track_button_style(control.data)
+                        visible = not (self.hide_broken and is_broken(control.data))
+                        if control.style != style or (control.visible is not False) != visible:
+                            control.style = style
+                            control.visible = visible
+                            changed_controls.append(control)
+            if facets_changed and self.facet_view is not None:
+                self.refresh_facet_list()
+                changed_controls.append(self.facet_list)
+            if covers_changed:
+                self.load_visible_artwork("all_tracks_list")
+                self.load_visible_artwork("current_track_list")
+            if changed_controls:
+                self.page.update(*changed_controls)
+            current = self.library.get_track_by_path(self.current_track_path)
+            if current is not None and current.id in track_ids:
+                self.refresh_metadata_fields(current)
+            return
+        if self.facet_view is not None:
+            self.refresh_facet_list()
+        self.page.update()
 
     def create_control_elements(self):
         """Метод создает элементы управления, такие как кнопки, ползунки и текстовые поля, которые используются для управления воспроизведением, выбора файлов, создания и управления плейлистами."""
@@ -73,6 +248,30 @@ class AudioPlayer:
             ),
             icon_color=Colors.black,
         )
+        self.next_track_button = ft.IconButton(
+            icon=ft.Icons.SKIP_NEXT,
+            on_click=self.play_next,
+            icon_color=Colors.black,
+        )
+        self.shuffle_button = ft.IconButton(
+            icon=ft.Icons.SHUFFLE,
+            tooltip="Случайный порядок",
+            on_click=self.toggle_shuffle,
+            icon_color=Colors.black,
+        )
+        self.shuffle_mode_list = ft.Dropdown(
+            width=170,
+            value=MODE_RANDOM,
+            options=[
+                ft.dropdown.Option(MODE_RANDOM, "Случайно"),
+                ft.dropdown.Option(MODE_FAVOR_UNPLAYED, "Сначала новые"),
+                ft.dropdown.Option(MODE_AVOID_SAME_ARTIST, "Разные авторы"),
+            ],
+            on_change=self.change_shuffle_mode,
+        )
+        self.shuffle_enabled = False
+        self.shuffler = None
+        self.shuffle_scope = None
         self.volume_down_button = ft.IconButton(
             icon=ft.Icons.REMOVE,
             on_click=self.volume_down,
@@ -124,6 +323,25 @@ class AudioPlayer:
         self.sort_by_genre_button = ft.IconButton(
             ft.Icons.MUSIC_NOTE, on_click=self.sort_by_genre
         )
+        self.play_similar_button = ft.IconButton(
+            ft.Icons.AUTO_AWESOME, tooltip="Похожие треки", on_click=self.play_similar
+        )
+        self.browse_artists_button = ft.IconButton(
+            ft.Icons.PEOPLE, tooltip="Исполнители", on_click=lambda _: self.show_facets("artist")
+        )
+        self.browse_genres_button = ft.IconButton(
+            ft.Icons.CATEGORY, tooltip="Жанры", on_click=lambda _: self.show_facets("genre")
+        )
+        self.facet_view = None
+        self.scan_library_button = ft.IconButton(
+            ft.Icons.HEALTH_AND_SAFETY,
+            tooltip="Проверить файлы",
+            on_click=lambda _: start_scan(self.library),
+        )
+        self.hide_broken = False
+        self.hide_broken_switch = ft.Switch(
+            label="Скрыть недоступные", value=False, on_change=self.toggle_hide_broken
+        )
 
         self.current_track = ft.Audio(
             src=" ",
@@ -131,25 +349,71 @@ class AudioPlayer:
             volume=0.5,
             balance=0,
             playback_rate=1,
+            on_loaded=self.on_track_loaded,
             on_state_changed=self.state_changed,
             on_position_changed=self.change_current_text_position,
         )
+        self.preview_track = ft.Audio(
+            src=" ",
+            autoplay=False,
+            volume=0.5,
+            on_loaded=self.on_preview_loaded,
+        )
+        self.page.overlay.append(self.preview_track)
+        self.preview_path = None
+        self.preview_source_path = None
+        self.preview_loaded = False
+        self.preview_seek_middle = False
+        self.preview_timer = None
+        self.preview_stop_timer = None
+        self.current_track_path = None
+        self.current_position = 0
+        self.pending_seek = None
+        self.sort_column = None
+        self.session_timer = None
         self.page.overlay.append(self.current_track)
         self.all_tracks_list = ft.ListView(
-            expand=True, height=300, auto_scroll=False, spacing=10, width=100
+            expand=True, height=300, auto_scroll=False, spacing=10, width=100,
+            on_scroll_interval=100,
+            on_scroll=lambda e: self.on_track_list_scroll(e, "all_tracks_list"),
         )
         self.current_track_list = ft.ListView(
-            expand=True, height=300, auto_scroll=False, spacing=10, width=100
+            expand=True, height=300, auto_scroll=False, spacing=10, width=100,
+            on_scroll_interval=100,
+            on_scroll=lambda e: self.on_track_list_scroll(e, "current_track_list"),
         )
+        self.scroll_offsets = {"all_tracks_list": 0, "current_track_list": 0}
+        self.artwork_rows = {"all_tracks_list": set(), "current_track_list": set()}
         self.playlist_list = ft.ListView(
             expand=True, height=300, auto_scroll=False, spacing=10, width=100
         )
+        self.facet_list = ft.ListView(
+            expand=True, height=300, auto_scroll=False, spacing=10, width=100
+        )
         self.metadata_list = ft.ListView(
             expand=True, height=300, auto_scroll=False, spacing=10, width=100
         )
         self.search_bar = ft.SearchBar(
             width=300, height=40, bar_hint_text="Поиск",
-            on_submit=self.search_by_metadata
+            on_submit=self.search_by_metadata,
+            on_change=self.on_search_change,
+        )
+        self.search_timer = None
+        self.metadata_fields = {}
+        self.selected_track_ids = set()
+        self.selected_count_text = ft.Text(value="Выбрано: 0")
+        self.bulk_metadata_fields = {
+            field: ft.TextField(label=label, width=150, height=40)
+            for field, label in (("artist", "Автор"), ("album", "Альбом"), ("genre", "Жанр"))
+        }
+        self.select_all_button = ft.TextButton(
+            text="Выбрать все", on_click=self.select_all_current_tracks
+        )
+        self.clear_selection_button = ft.TextButton(
+            text="Снять выделение", on_click=self.clear_selection
+        )
+        self.update_selected_button = ft.ElevatedButton(
+            text="Изменить выбранные", on_click=self.update_selected_metadata
         )
         self.current_track_source = None
         self.speed_list = ft.Dropdown(
@@ -188,9 +452,12 @@ class AudioPlayer:
                     self.play_pause_button,
                     self.stop_button,
                     self.rewind_forward_button,
+                    self.next_track_button,
+                    self.shuffle_button,
                     ft.Container(expand=True),
                     self.current_text_position,
                     self.speed_list,
+                    self.shuffle_mode_list,
                 ]
             ),
         )
@@ -216,16 +483,33 @@ class AudioPlayer:
                             self.sort_by_artist_button,
                             self.sort_by_album_button,
                             self.sort_by_genre_button,
+                            self.browse_artists_button,
+                            self.browse_genres_button,
+                            self.play_similar_button,
+                            self.scan_library_button,
+                            self.hide_broken_switch,
                             self.search_bar
                         ],
                     ),
                 ),
+                ft.Container(
+                    ft.Row(
+                        [
+                            self.select_all_button,
+                            self.clear_selection_button,
+                            self.selected_count_text,
+                            *self.bulk_metadata_fields.values(),
+                            self.update_selected_button,
+                        ],
+                    ),
+                ),
                 ft.Container(expand=True),
                 ft.Row(
                     [
                         self.all_tracks_list,
                         self.current_track_list,
                         self.playlist_list,
+                        self.facet_list,
                     ],
                 ),
                 ft.Container(
@@ -237,21 +521,127 @@ class AudioPlayer:
             expand=True,
         )
 
-    def save_metadata_to_db(self, path):
-        """Метод извлекает метаданные аудиофайла, такие как исполнитель, альбом и жанр, и сохраняет их в таблицу 'audio_history' в базе данных.
+    def create_track_button(self, track, source):
+        """Метод создает кнопку трека для списка треков.
+
+        Трек сохраняется в атрибуте 'data' кнопки, чтобы строку можно было найти по идентификатору трека, а обложку загрузить позже, когда строка станет видимой.
+        Долгое нажатие на кнопку добавляет трек в выделение для группового изменения метаданных,
+        а наведение указателя запускает предпрослушивание.
+        Недоступные по результатам проверки треки выделяются цветом или скрываются.
 
         Args:
-            path (str): Путь к аудиофайлу, для которого необходимо сохранить метаданные.
+            track (Track): Трек из общей библиотеки.
+            source (str): Список, в котором находится кнопка (например, "all_tracks_list").
+
+        Returns:
+            flet.TextButton: Кнопка трека.
         """
-        connection = sqlite3.connect("audio_history.db")
-        cursor = connection.cursor()
-        metadata = get_metadata(path)
-        cursor.execute(
-            "INSERT OR IGNORE INTO audio_history (path, artist, album, genre) VALUES (?, ?, ?, ?)",
-            (path, metadata["artist"], metadata["album"], metadata["genre"]),
+        full_path = track.path
+        new_text_button = ft.TextButton(
+            text=track.display_name,
+            data=track,
+            on_long_press=self.toggle_track_selection,
+            on_hover=self.on_track_hover,
+            style=self.track_button_style(track),
+            visible=not (self.hide_broken and is_broken(track)),
         )
-        connection.commit()
-        connection.close()
+        new_text_button.on_click = (
+            lambda _, full_path=full_path: self.play_selected_file(full_path, source)
+        )
+        return new_text_button
+
+    def track_button_style(self, track):
+        """Метод возвращает стиль кнопки трека с учетом выделения и доступности файла.
+
+        Args:
+            track (Track): Трек из общей библиотеки.
+
+        Returns:
+            flet.ButtonStyle | None: Стиль кнопки или None для обычной строки.
+        """
+        selected = track.id in self.selected_track_ids
+        broken = is_broken(track)
+        if not selected and not broken:
+            return None
+        return ft.ButtonStyle(
+            bgcolor=Colors.green if selected else None,
+            color=Colors.red if broken else None,
+        )
+
+    def toggle_hide_broken(self, e):
+        """Метод скрывает или показывает в списках треки, файлы которых недоступны.
+
+        Args:
+            e (flet.Event): Событие переключателя.
+        """
+        self.hide_broken = bool(e.control.value)
+        for list_view in (self.all_tracks_list, self.current_track_list):
+            for control in list_view.controls:
+                control.visible = not (self.hide_broken and is_broken(control.data))
+        self.load_visible_artwork("all_tracks_list")
+        self.load_visible_artwork("current_track_list")
+        self.page.update()
+
+    def on_track_list_scroll(self, e, list_name):
+        """Метод запоминает позицию прокрутки списка треков и загружает обложки для видимых строк.
+
+        Args:
+            e (flet.OnScrollEvent): Событие прокрутки списка.
+            list_name (str): Название списка треков (например, "all_tracks_list").
+        """
+        self.scroll_offsets[list_name] = e.pixels or 0
+        self.load_visible_artwork(list_name, e.viewport_dimension)
+        self.schedule_session_save()
+
+    def load_visible_artwork(self, list_name, viewport_height=None):
+        """Метод показывает обложки только для видимых строк списка треков.
+
+        Видимые строки вычисляются по позиции прокрутки и фиксированной высоте строки.
+        У строк, которые вышли из видимой области, обложка убирается, поэтому объём данных в списке не растет при прокрутке.
+        Обложки берутся из кэша миниатюр, теги аудиофайлов при этом не читаются.
+
+        Args:
+            list_name (str): Название списка треков (например, "all_tracks_list").
+            viewport_height (float | None): Высота видимой области списка в пикселях.
+        """
+        controls = getattr(self, list_name).controls
+        if self.hide_broken:
+            controls = [control for control in controls if control.visible is not False]
+        viewport_height = viewport_height or getattr(self, list_name).height
+        offset = self.scroll_offsets[list_name]
+        first = int(offset // Artwork.row_height)
+        last = min(int((offset + viewport_height) // Artwork.row_height) + 1, len(controls))
+        visible = set(range(first, last))
+        self.scheduler.boost([controls[index].data.id for index in visible], PRIORITY_VISIBLE)
+        store = get_artwork_store()
+        changed = False
+
+        for index in self.artwork_rows[list_name] - visible:
+            if index < len(controls) and controls[index].content is not None:
+                controls[index].content = None
+                changed = True
+
+        loaded_rows = set()
+        for index in visible:
+            control = controls[index]
+            if control.content is not None:
+                loaded_rows.add(index)
+                continue
+            cover = store.get_base64(control.data.cover_hash)
+            if cover is None:
+                continue
+            control.content = ft.Row(
+                [
+                    ft.Image(src_base64=cover, width=32, height=32, fit=ft.ImageFit.COVER),
+                    ft.Text(control.text),
+                ]
+            )
+            loaded_rows.add(index)
+            changed = True
+        self.artwork_rows[list_name] = loaded_rows
+
+        if changed:
+            self.page.update()
 
     def create_playlist(self, _):
         """Создание нового плейлиста.
@@ -261,7 +651,7 @@ class AudioPlayer:
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
         cursor.execute("SELECT MAX(id) FROM playlists_history")
         max_playlist_number = cursor.fetchone()[0] or 0
@@ -278,46 +668,16 @@ class AudioPlayer:
     def delete_track(self, _):
         """Метод удаляет указанный трек из таблиц 'audio_history' и 'playlist_tracks' в базе данных, и из интерфейса пользователя.
 
+        Строки трека удаляются из списков всех сессий по уведомлению общей библиотеки.
+
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        if not self.current_track.src:
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is None:
             return
 
-        connection = sqlite3.connect("audio_history.db")
-        cursor = connection.cursor()
-
-        cursor.execute(
-            "SELECT id FROM audio_history WHERE path = ?", (self.current_track.src,)
-        )
-        track_id = cursor.fetchone()[0]
-
-        cursor.execute("DELETE FROM audio_history WHERE id = ?", (track_id,))
-
-        cursor.execute("DELETE FROM playlist_tracks WHERE track_id = ?", (track_id,))
-
-        connection.commit()
-        connection.close()
-
-        self.all_tracks_list.controls = [
-            control
-            for control in self.all_tracks_list.controls
-            if control.text
-            != self.current_track.src[
-                self.current_track.src.rfind("\\")
-                + 1 : self.current_track.src.rfind(".")
-            ]
-        ]
-        self.current_track_list.controls = [
-            control
-            for control in self.current_track_list.controls
-            if control.text
-            != self.current_track.src[
-                self.current_track.src.rfind("\\")
-                + 1 : self.current_track.src.rfind(".")
-            ]
-        ]
-        self.page.update()
+        self.library.delete_track(track.id)
 
     def delete_playlist(self, _):
         """Метод удаляет указанный плейлист из таблицы 'playlists_history' в базе данных, удаляет все записи, связанные с ним в таблице 'playlist_tracks' и удаляет плейлист из интерфейса пользователя.
@@ -328,7 +688,7 @@ class AudioPlayer:
         if not self.current_playlist:
             return
 
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
 
         cursor.execute(
@@ -360,7 +720,7 @@ class AudioPlayer:
         Args:
             playlist_name (str): Имя плейлиста, который нужно сохранить.
         """
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
         cursor.execute(
             "INSERT INTO playlists_history (playlist_name) VALUES (?)", (playlist_name,)
@@ -382,7 +742,7 @@ class AudioPlayer:
         if not new_name:
             return
 
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
 
         cursor.execute(
@@ -416,33 +776,27 @@ class AudioPlayer:
         self.rename_playlist_button.value = ""
 
     def add_new_track(self, e):
-        """Метод проверяет наличие трека в базе данных, и если его нет, добавляет его в таблицу 'audio_history' и в список всех треков.
+        """Метод проверяет наличие трека в библиотеке, и если его нет, добавляет его в таблицу 'audio_history' и в список всех треков.
+
+        Кнопка трека добавляется в списки всех сессий по уведомлению общей библиотеки.
+        Теги, обложка и аудиопризнаки читаются фоновыми задачами с наивысшим приоритетом,
+        а до их выполнения у трека указаны значения по умолчанию.
 
         Args:
             e (flet.Event): Событие, содержащее информацию о выбранном файле.
         """
         for file in e.files:
-            connection = sqlite3.connect("audio_history.db")
-            cursor = connection.cursor()
-            cursor.execute(
-                "SELECT COUNT(*) FROM audio_history WHERE path=?", (file.path,)
-            )
-            count = cursor.fetchone()[0]
-            connection.close()
-
-            if count != 0:
+            if self.library.get_track_by_path(file.path) is not None:
                 return
 
-            filename = file.name[: file.name.rfind(".")]
-            new_text_button = ft.TextButton(text=filename)
-            new_text_button.on_click = lambda _: self.play_selected_file(
-                file.path, "all_tracks_list"
+            track = self.library.add_track(
+                file.path, UNKNOWN_METADATA["artist"], UNKNOWN_METADATA["album"], UNKNOWN_METADATA["genre"]
             )
-            self.all_tracks_list.controls.append(new_text_button)
-            self.page.update()
+            if track is not None:
+                self.scheduler.enqueue("metadata", [track], PRIORITY_PLAYING)
+                self.scheduler.enqueue("features", [track], PRIORITY_PLAYING)
 
-            self.current_track.src = file.path
-            self.save_metadata_to_db(file.path)
+            self.set_current_track_source(file.path)
             self.current_track.update()
 
     def update_metadata_list(self):
@@ -451,62 +805,239 @@ class AudioPlayer:
         Метод очищает текущий список метаданных и заполняет его актуальными для текущего трека метаданными.
         """
         self.metadata_list.controls.clear()
-        if self.current_track.src:
-            connection = sqlite3.connect("audio_history.db")
-            cursor = connection.cursor()
-            cursor.execute(
-                "SELECT path, artist, album, genre FROM audio_history WHERE path = ?",
-                (self.current_track.src,),
-            )
-            meta = cursor.fetchall()[0]
-            cursor.close()
-            self.metadata_list.controls.append(
-                ft.TextField(value=f"{meta[0]}", helper_text="Автор", on_submit=self.update_metadata)
-            )
+        self.metadata_fields = {}
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is not None:
             self.metadata_list.controls.append(
-                ft.TextField(value=f"{meta[1]}", helper_text="Автор", on_submit=self.update_metadata)
-            )
-            self.metadata_list.controls.append(
-                ft.TextField(value=f"{meta[2]}", helper_text="Альбом", on_submit=self.update_metadata)
-            )
-            self.metadata_list.controls.append(
-                ft.TextField(value=f"{meta[3]}", helper_text="Жанр", on_submit=self.update_metadata)
+                ft.TextField(value=track.path, helper_text="Путь", read_only=True)
             )
+            for field, helper_text in (("artist", "Автор"), ("album", "Альбом"), ("genre", "Жанр")):
+                self.metadata_fields[field] = ft.TextField(
+                    value=getattr(track, field),
+                    helper_text=helper_text,
+                    data=field,
+                    on_submit=self.update_metadata,
+                )
+                self.metadata_list.controls.append(self.metadata_fields[field])
+            cover = get_artwork_store().get_base64(track.cover_hash)
+            if cover is not None:
+                self.metadata_list.controls.append(
+                    ft.Image(src_base64=cover, width=128, height=128, fit=ft.ImageFit.CONTAIN)
+                )
         self.page.update()
 
-    def update_metadata(self, _):
-        """Метод извлекает текущие метаданные трека из списка метаданных и обновляет соответствующие записи в базе данных.
+    def refresh_metadata_fields(self, track):
+        """Метод обновляет значения в полях метаданных текущего трека без перестройки списка.
+
+        Args:
+            track (Track): Измененный текущий трек.
+        """
+        if not self.metadata_fields:
+            self.update_metadata_list()
+            return
+        for field, text_field in self.metadata_fields.items():
+            text_field.value = getattr(track, field)
+        self.page.update(self.metadata_list)
+
+    def update_metadata(self, e):
+        """Метод сохраняет измененное поле метаданных текущего трека в базе данных.
+
+        Поле определяется по атрибуту 'data' текстового поля. Поля метаданных обновляются по уведомлению общей библиотеки.
+
+        Args:
+            e (flet.Event): Событие, содержащее текстовое поле, в котором изменено значение.
+        """
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is None:
+            return
+
+        self.library.update_tracks([track.id], **{e.control.data: e.control.value})
+
+    def toggle_track_selection(self, e):
+        """Метод добавляет трек в выделение или убирает его оттуда по долгому нажатию на строку.
+
+        Args:
+            e (flet.Event): Событие, содержащее кнопку трека.
+        """
+        track_id = e.control.data.id
+        if track_id in self.selected_track_ids:
+            self.selected_track_ids.discard(track_id)
+        else:
+            self.selected_track_ids.add(track_id)
+        self.update_selection_view()
+
+    def select_all_current_tracks(self, _):
+        """Метод выделяет все треки в current_track_list, например результат поиска, плейлист или похожие треки.
 
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        connection = sqlite3.connect("audio_history.db")
-        cursor = connection.cursor()
+        self.selected_track_ids = {control.data.id for control in self.current_track_list.controls}
+        self.update_selection_view()
 
-        cursor.execute(
-            "UPDATE audio_history SET (artist, album, genre) = (?, ?, ?) WHERE path = ?",
-            (
-                self.metadata_list.controls[1].value,
-                self.metadata_list.controls[2].value,
-                self.metadata_list.controls[3].value,
-                self.metadata_list.controls[0].value,
-            ),
-        )
-        connection.commit()
-        connection.close()
+    def clear_selection(self, _):
+        """Метод снимает выделение со всех треков.
 
-        self.update_metadata_list()
-        self.page.update()
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        self.selected_track_ids = set()
+        self.update_selection_view()
+
+    def update_selection_view(self):
+        """Метод подсвечивает выделенные строки и показывает количество выделенных треков.
+
+        Обновляются только строки, у которых изменилось состояние выделения.
+        """
+        changed_controls = []
+        for list_view in (self.all_tracks_list, self.current_track_list):
+            for control in list_view.controls:
+                style = self.track_button_style(control.data)
+                if control.style != style:
+                    control.style = style
+                    changed_controls.append(control)
+        self.selected_count_text.value = f"Выбрано: {len(self.selected_track_ids)}"
+        self.page.update(self.selected_count_text, *changed_controls)
+
+    def update_selected_metadata(self, _):
+        """Метод задает исполнителя, альбом и (или) жанр всем выделенным трекам одной операцией.
+
+        Изменяются только заполненные поля. Все треки обновляются одним запросом к базе данных.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        fields = {
+            field: text_field.value.strip()
+            for field, text_field in self.bulk_metadata_fields.items()
+            if text_field.value and text_field.value.strip()
+        }
+        if not self.selected_track_ids or not fields:
+            return
+
+        self.library.update_tracks(self.selected_track_ids, **fields)
+        for text_field in self.bulk_metadata_fields.values():
+            text_field.value = ""
+        self.page.update(*self.bulk_metadata_fields.values())
+
+    def set_current_track_source(self, file_path):
+        """Метод выбирает файл для воспроизведения в 'current_track'.
+
+        Если запущен локальный сервер потоковой передачи, источником становится адрес трека на сервере,
+        поэтому при перемотке клиент загружает только нужные диапазоны байтов. Иначе используется путь к файлу.
+        Путь к файлу сохраняется в 'current_track_path' для запросов к базе данных.
+
+        Args:
+            file_path (str): Путь к аудиофайлу.
+        """
+        self.current_track_path = file_path
+        self.current_position = 0
+        self.pending_seek = None
+        track = self.library.get_track_by_path(file_path)
+        self.current_track.src = (track and track_url(track.id)) or file_path
+        if track is not None:
+            self.scheduler.boost([track.id], PRIORITY_PLAYING)
+        self.schedule_session_save()
+
+    def on_track_hover(self, e):
+        """Метод запускает предпрослушивание трека при наведении указателя и останавливает его, когда указатель уходит.
+
+        Предпрослушивание начинается после короткой задержки 'Preview.hover_delay', чтобы не вырезать и не передавать
+        клиенту фрагменты всех треков, над которыми указатель проходит при перемещении.
+
+        Args:
+            e (flet.HoverEvent): Событие наведения, содержащее кнопку трека.
+        """
+        if self.preview_timer is not None:
+            self.preview_timer.cancel()
+        if e.data == "true":
+            self.preview_timer = threading.Timer(Preview.hover_delay, self.start_preview, [e.control.data])
+            self.preview_timer.daemon = True
+            self.preview_timer.start()
+        else:
+            self.stop_preview()
+
+    def start_preview(self, track):
+        """Метод начинает предпрослушивание фрагмента из середины трека в отдельном 'preview_track'.
+
+        Для PCM WAV фрагмент вырезается из файла и передается в виде base64, для остальных форматов
+        загружается весь трек и воспроизведение начинается с середины. Текущий трек при этом не меняется.
+
+        Args:
+            track (Track): Трек из общей библиотеки.
+        """
+        if not os.path.isfile(track.path):
+            return
+        self.preview_path = track.path
+        if self.preview_source_path == track.path:
+            if self.preview_loaded:
+                self.play_preview()
+            return
+        encoded = get_preview_store().get_base64(track.path)
+        if encoded is not None:
+            self.preview_track.src = None
+            self.preview_track.src_base64 = encoded
+            self.preview_seek_middle = False
+        else:
+            self.preview_track.src_base64 = None
+            self.preview_track.src = track_url(track.id) or track.path
+            self.preview_seek_middle = True
+        self.preview_source_path = track.path
+        self.preview_loaded = False
+        self.preview_track.volume = self.current_track.volume
+        self.page.update(self.preview_track)
+
+    def on_preview_loaded(self, _):
+        """Метод начинает воспроизведение фрагмента, когда 'preview_track' загружен.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        self.preview_loaded = True
+        if self.preview_path is not None and self.preview_path == self.preview_source_path:
+            self.play_preview()
+
+    def play_preview(self):
+        """Метод воспроизводит загруженный фрагмент и останавливает его через 'Preview.seconds' секунд."""
+        if self.preview_seek_middle:
+            duration = self.preview_track.get_duration() or 0
+            self.preview_track.seek(max(0, int(duration / 2 - Preview.seconds * 500)))
+            self.preview_track.resume()
+        else:
+            self.preview_track.play()
+        if self.preview_stop_timer is not None:
+            self.preview_stop_timer.cancel()
+        self.preview_stop_timer = threading.Timer(Preview.seconds, self.stop_preview)
+        self.preview_stop_timer.daemon = True
+        self.preview_stop_timer.start()
+
+    def stop_preview(self):
+        """Метод останавливает предпрослушивание."""
+        if self.preview_stop_timer is not None:
+            self.preview_stop_timer.cancel()
+        if self.preview_path is not None:
+            self.preview_path = None
+            self.preview_track.pause()
 
     def play_selected_file(self, file_path, source):
         """Метод начинает воспроизведение указанного файла, обновляя различные элементы управления и списки треков.
 
+        Если файла больше нет на диске, трек отмечается как недоступный и воспроизведение не начинается.
+
         Args:
             file_path (str): Путь к файлу, который нужно воспроизвести.
             source (str): Источник, откуда был выбран файл (например, "all_tracks_list").
         """
+        track = self.library.get_track_by_path(file_path)
+        if track is not None and not os.path.isfile(file_path):
+            self.library.update_statuses([(track.id, STATUS_MISSING)])
+            return
+
+        self.stop_preview()
+        if track is not None:
+            self.library.record_play(track.id)
         self.current_track_source = source
-        self.current_track.src = file_path
+        self.set_current_track_source(file_path)
         self.current_track.update()
         self.current_track.play()
         self.play_pause_button.icon = ft.Icons.PAUSE
@@ -519,67 +1050,71 @@ class AudioPlayer:
         Args:
             e (flet.Event): Событие, содержащее информацию о выбранном плейлисте.
         """
-        self.current_playlist = e.control.text
-        connection = sqlite3.connect("audio_history.db")
+        self.open_playlist(e.control.text)
+
+    def open_playlist(self, playlist_name):
+        """Метод открывает плейлист по названию, заполняя список current_track_list треками из него.
+
+        Args:
+            playlist_name (str): Название плейлиста.
+        """
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
 
         cursor.execute(
             "SELECT id FROM playlists_history WHERE playlist_name = ?",
-            (self.current_playlist,),
+            (playlist_name,),
         )
-        playlist_id = cursor.fetchone()[0]
+        row = cursor.fetchone()
+        if row is None:
+            connection.close()
+            self.current_playlist = None
+            return
+        self.current_playlist = playlist_name
+        self.schedule_session_save()
+        playlist_id = row[0]
 
         cursor.execute(
-            """
-            SELECT ah.path, ah.artist, ah.album, ah.genre
-            FROM audio_history ah
-            JOIN playlist_tracks pt ON ah.id = pt.track_id
-            WHERE pt.playlist_id = ?
-            """,
+            "SELECT track_id FROM playlist_tracks WHERE playlist_id = ?",
             (playlist_id,),
         )
-        tracks = cursor.fetchall()
+        track_ids = cursor.fetchall()
         connection.close()
 
         self.current_track_list.controls.clear()
+        self.reset_playlist_shuffle()
 
-        for track in tracks:
-            full_path = track[0]
-            filename = full_path[full_path.rfind("\\") + 1 : full_path.rfind(".")]
-            new_text_button = ft.TextButton(text=filename)
-            new_text_button.on_click = (
-                lambda _, full_path=full_path: self.play_selected_file(
-                    full_path, "current_track_list"
+        for (track_id,) in track_ids:
+            track = self.library.get_track(track_id)
+            if track is not None:
+                self.current_track_list.controls.append(
+                    self.create_track_button(track, "current_track_list")
                 )
-            )
-            self.current_track_list.controls.append(new_text_button)
 
+        self.load_visible_artwork("current_track_list")
         self.page.update()
 
     def load_tracks_from_db(self):
-        """Метод загружает все доступные треки из базы данных и добавляет их в список всех треков."""
-        connection = sqlite3.connect("audio_history.db")
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM audio_history")
-        tracks = cursor.fetchall()
-        connection.close()
+        """Метод загружает все доступные треки из общей библиотеки и добавляет их в список всех треков.
 
+        Треки читаются из индекса в памяти, который загружается из базы данных один раз на процесс.
+        Если в прошлой сессии была выбрана сортировка, треки сразу выводятся в этом порядке.
+        """
+        if self.sort_column:
+            tracks = self.library.sorted_tracks(self.sort_column)
+        else:
+            tracks = self.library.all_tracks()
         for track in tracks:
-            full_path = track[1]
-            filename = full_path[full_path.rfind("\\") + 1 : full_path.rfind(".")]
-            new_text_button = ft.TextButton(text=filename)
-            new_text_button.on_click = (
-                lambda _, full_path=full_path: self.play_selected_file(
-                    full_path, "all_tracks_list"
-                )
+            self.all_tracks_list.controls.append(
+                self.create_track_button(track, "all_tracks_list")
             )
-            self.all_tracks_list.controls.append(new_text_button)
 
+        self.load_visible_artwork("all_tracks_list")
         self.page.update()
 
     def load_playlists_from_db(self):
         """Метод загружает все доступные плейлисты из базы данных и добавляет их в список плейлистов."""
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
         cursor.execute("SELECT * FROM playlists_history")
         playlists = cursor.fetchall()
@@ -600,10 +1135,12 @@ class AudioPlayer:
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        if not self.current_track.src or not self.current_playlist:
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is None or not self.current_playlist:
             return
+        track_id = track.id
 
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
 
         cursor.execute(
@@ -612,11 +1149,6 @@ class AudioPlayer:
         )
         playlist_id = cursor.fetchone()[0]
 
-        cursor.execute(
-            "SELECT id FROM audio_history WHERE path = ?", (self.current_track.src,)
-        )
-        track_id = cursor.fetchone()[0]
-
         cursor.execute(
             """
             SELECT COUNT(*)
@@ -628,6 +1160,7 @@ class AudioPlayer:
         count = cursor.fetchone()[0]
 
         if count != 0:
+            connection.close()
             return
 
         cursor.execute(
@@ -637,15 +1170,10 @@ class AudioPlayer:
         connection.commit()
         connection.close()
 
-        full_path = self.current_track.src
-        filename = full_path[full_path.rfind("\\") + 1 : full_path.rfind(".")]
-        new_text_button = ft.TextButton(text=filename)
-        new_text_button.on_click = (
-            lambda _, full_path=full_path: self.play_selected_file(
-                full_path, "current_track_list"
-            )
+        self.current_track_list.controls.append(
+            self.create_track_button(track, "current_track_list")
         )
-        self.current_track_list.controls.append(new_text_button)
+        self.load_visible_artwork("current_track_list")
         self.page.update()
 
     def remove_from_playlist(self, _):
@@ -654,10 +1182,12 @@ class AudioPlayer:
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        if not self.current_track.src or not self.current_playlist:
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is None or not self.current_playlist:
             return
+        track_id = track.id
 
-        connection = sqlite3.connect("audio_history.db")
+        connection = sqlite3.connect(self.db_path)
         cursor = connection.cursor()
 
         cursor.execute(
@@ -666,11 +1196,6 @@ class AudioPlayer:
         )
         playlist_id = cursor.fetchone()[0]
 
-        cursor.execute(
-            "SELECT id FROM audio_history WHERE path = ?", (self.current_track.src,)
-        )
-        track_id = cursor.fetchone()[0]
-
         cursor.execute(
             "DELETE FROM playlist_tracks WHERE playlist_id = ? AND track_id = ?" "",
             (playlist_id, track_id),
@@ -680,42 +1205,135 @@ class AudioPlayer:
         self.current_track_list.controls = [
             control
             for control in self.current_track_list.controls
-            if control.text
-            != self.current_track.src[
-                self.current_track.src.rfind("\\")
-                + 1 : self.current_track.src.rfind(".")
-            ]
+            if control.data.id != track_id
         ]
+        self.reset_playlist_shuffle()
         self.page.update()
         connection.close()
 
+    def on_search_change(self, _):
+        """Метод запускает поиск по мере ввода с задержкой.
+
+        Каждый новый символ откладывает поиск, поэтому при быстром наборе он выполняется один раз.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        if self.search_timer is not None:
+            self.search_timer.cancel()
+        self.search_timer = threading.Timer(Search.debounce, self.search_by_metadata, [None])
+        self.search_timer.daemon = True
+        self.search_timer.start()
+
     def search_by_metadata(self, _):
-        """Метод ищет треки в базе данных, соответствующие указанным критериям поиска, и добавляет их в current_track_list.
+        """Метод ищет треки в общей библиотеке, похожие на строку поиска, и добавляет их в current_track_list.
+
+        Если строка поиска пуста, в current_track_list возвращается открытый плейлист или, если он не открыт, все треки.
+        Если строка короче 'Search.min_query_length', список не изменяется до ввода следующего символа.
 
         Args:
             _ (Any): Игнорируемый аргумент
         """
-        search_bar_request = f"%{self.search_bar.value}%"
-        connection = sqlite3.connect("audio_history.db")
-        cursor = connection.cursor()
-        cursor.execute(
-            "SELECT path FROM audio_history WHERE artist Like ? OR album LIKE ? or genre LIKE ?",
-            (search_bar_request, search_bar_request, search_bar_request),
-        )
-        tracks = cursor.fetchall()
-        connection.close()
+        if self.search_timer is not None:
+            self.search_timer.cancel()
+        text = self.search_bar.value or ""
+        if 0 < len(text.strip()) < Search.min_query_length:
+            return
+        if not text.strip():
+            if self.current_playlist:
+                self.open_playlist(self.current_playlist)
+                return
+            tracks = self.library.all_tracks()
+        else:
+            tracks = self.library.search(text)
 
         self.current_track_list.controls.clear()
+        self.reset_playlist_shuffle()
         for track in tracks:
-            full_path = track[0]
-            filename = full_path[full_path.rfind("\\") + 1 : full_path.rfind(".")]
-            new_text_button = ft.TextButton(text=filename)
-            new_text_button.on_click = (
-                lambda _, full_path=full_path: self.play_selected_file(
-                    full_path, "current_track_list"
+            self.current_track_list.controls.append(
+                self.create_track_button(track, "current_track_list")
+            )
+        self.load_visible_artwork("current_track_list")
+        self.page.update()
+
+    def play_similar(self, _):
+        """Метод заполняет current_track_list треками, похожими по звучанию на текущий трек.
+
+        Похожие треки находятся по индексу векторов аудиопризнаков. Если текущий трек еще не анализировался, он анализируется сразу.
+        Если вектор признаков получить не удалось, например для формата без декодера, список не изменяется.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        track = self.library.get_track_by_path(self.current_track_path)
+        if track is None:
+            return
+        similarity_index = get_similarity_index()
+        if not similarity_index.contains(track.id):
+            save_track_features(self.library, track, analyze_file(track.path))
+            if not similarity_index.contains(track.id):
+                return
+
+        self.current_track_list.controls.clear()
+        self.reset_playlist_shuffle()
+        for track_id in similarity_index.similar(track.id):
+            similar_track = self.library.get_track(track_id)
+            if similar_track is not None:
+                self.current_track_list.controls.append(
+                    self.create_track_button(similar_track, "current_track_list")
+                )
+        self.load_visible_artwork("current_track_list")
+        self.page.update()
+
+    def show_facets(self, facet, artist_id=None):
+        """Метод показывает в списке facet_list исполнителей, альбомы исполнителя или жанры с количеством треков.
+
+        Args:
+            facet (str): "artist", "album" или "genre".
+            artist_id (int | None): Идентификатор исполнителя, альбомы которого нужно показать.
+        """
+        self.facet_view = (facet, artist_id)
+        self.refresh_facet_list()
+        self.page.update()
+
+    def refresh_facet_list(self):
+        """Метод перечитывает значения, показанные в списке facet_list, вместе со счетчиками треков."""
+        facet, artist_id = self.facet_view
+        controls = []
+        if facet == "album":
+            controls.append(
+                ft.TextButton(text="Все исполнители", on_click=lambda _: self.show_facets("artist"))
+            )
+        for item in self.library.list_facets(facet, artist_id):
+            controls.append(
+                ft.TextButton(
+                    text=f"{item.name} ({item.track_count})",
+                    data=(facet, item.id),
+                    on_click=self.open_facet,
                 )
             )
-            self.current_track_list.controls.append(new_text_button)
+        self.facet_list.controls = controls
+
+    def open_facet(self, e):
+        """Метод заполняет current_track_list треками выбранного исполнителя, альбома или жанра.
+
+        При выборе исполнителя в списке facet_list показываются его альбомы.
+
+        Args:
+            e (flet.Event): Событие, содержащее вид и идентификатор выбранного значения.
+        """
+        facet, facet_id = e.control.data
+        if facet == "artist":
+            self.facet_view = ("album", facet_id)
+            self.refresh_facet_list()
+
+        self.current_track_list.controls.clear()
+        self.reset_playlist_shuffle()
+        for track in self.library.facet_tracks(facet, facet_id):
+            self.current_track_list.controls.append(
+                self.create_track_button(track, "current_track_list")
+            )
+        self.load_visible_artwork("current_track_list")
         self.page.update()
 
     def sort_by_genre(self, _):
@@ -748,25 +1366,16 @@ class AudioPlayer:
         Args:
             column (str): Название столбца, по которому нужно выполнять сортировку.
         """
-        conn = sqlite3.connect("audio_history.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            f"SELECT path, artist, album, genre FROM audio_history ORDER BY {column} ASC"
-        )
-        tracks = cursor.fetchall()
-        conn.close()
+        tracks = self.library.sorted_tracks(column)
+        self.sort_column = column
+        self.schedule_session_save()
 
         self.all_tracks_list.controls.clear()
         for track in tracks:
-            full_path = track[0]
-            filename = full_path[full_path.rfind("\\") + 1 : full_path.rfind(".")]
-            new_text_button = ft.TextButton(text=filename)
-            new_text_button.on_click = (
-                lambda _, full_path=full_path: self.play_selected_file(
-                    full_path, "all_tracks_list"
-                )
+            self.all_tracks_list.controls.append(
+                self.create_track_button(track, "all_tracks_list")
             )
-            self.all_tracks_list.controls.append(new_text_button)
+        self.load_visible_artwork("all_tracks_list")
         self.page.update()
 
     def toggle_play_pause(self, _):
@@ -791,6 +1400,117 @@ class AudioPlayer:
             e (flet.Event): Событие, отражающее изменение состояния аудиофайла.
         """
         self.current_state = e.data
+        if e.data == "completed":
+            self.play_next(None)
+
+    def toggle_shuffle(self, _):
+        """Метод включает или выключает случайный порядок воспроизведения.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        self.shuffle_enabled = not self.shuffle_enabled
+        self.shuffler = None
+        self.shuffle_button.icon = ft.Icons.SHUFFLE_ON if self.shuffle_enabled else ft.Icons.SHUFFLE
+        self.shuffle_button.update()
+        self.schedule_session_save()
+
+    def change_shuffle_mode(self, _):
+        """Метод применяет выбранный режим случайного порядка, начиная новую перестановку.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        self.shuffler = None
+        self.schedule_session_save()
+
+    def next_shuffled_track(self):
+        """Метод выбирает следующий трек в случайном порядке из открытого плейлиста или всей библиотеки.
+
+        Если текущий трек выбран в плейлисте, перемешиваются позиции плейлиста, иначе идентификаторы треков библиотеки.
+        Перестановка создается заново при смене плейлиста или режима, при изменении количества позиций,
+        например после импорта треков, и при перестроении current_track_list (`reset_playlist_shuffle`).
+
+        Returns:
+            tuple[Track, str] | None: Трек и список, из которого он выбран, или None, если подходящих треков нет.
+        """
+        if self.current_track_source == "current_track_list" and self.current_playlist:
+            scope = ("current_track_list", self.current_playlist)
+        else:
+            scope = ("all_tracks_list", None)
+        if scope[0] == "current_track_list":
+            size = len(self.current_track_list.controls)
+            get_track = self.playlist_track_at
+        else:
+            # Идентификаторы треков почти непрерывны, поэтому перемешивается диапазон идентификаторов,
+            # а отсутствующие идентификаторы пропускаются.
+            size = self.library.max_track_id()
+            get_track = lambda position: self.library.get_track(position + 1)
+        if self.shuffler is None or self.shuffle_scope != scope or self.shuffler.size != size:
+            self.shuffler = Shuffler(size, get_track, self.shuffle_mode_list.value, self.library.play_count)
+            self.shuffle_scope = scope
+        track = self.shuffler.next_track(lambda track: is_broken(track) or track.path == self.current_track_path)
+        return (track, scope[0]) if track is not None else None
+
+    def reset_playlist_shuffle(self):
+        """Метод сбрасывает случайный порядок по current_track_list после изменения списка.
+
+        Позиции перестановки указывают на строки списка, поэтому после удаления строк или замены списка
+        они указывают на другие треки. Порядок по всей библиотеке не сбрасывается: удаленные треки в нем
+        пропускаются, а новые учитываются по изменению наибольшего идентификатора.
+        """
+        if self.shuffle_scope is not None and self.shuffle_scope[0] == "current_track_list":
+            self.shuffler = None
+
+    def playlist_track_at(self, position):
+        """Метод возвращает трек открытого плейлиста по позиции.
+
+        Args:
+            position (int): Позиция в списке 'current_track_list'.
+
+        Returns:
+            Track | None: Трек или None, если позиции нет в списке.
+        """
+        controls = self.current_track_list.controls
+        return controls[position].data if position < len(controls) else None
+
+    def next_listed_track(self):
+        """Метод выбирает трек, следующий за текущим в списке, из которого он был выбран.
+
+        Returns:
+            tuple[Track, str] | None: Трек и список или None, если текущий трек последний.
+        """
+        source = self.current_track_source or "all_tracks_list"
+        controls = getattr(self, source).controls
+        index = next(
+            (i for i, control in enumerate(controls) if control.data.path == self.current_track_path), -1
+        )
+        for control in controls[index + 1 :]:
+            if not is_broken(control.data):
+                return control.data, source
+        return None
+
+    def play_next(self, _):
+        """Метод воспроизводит следующий трек в случайном порядке или по списку.
+
+        Вызывается кнопкой перехода и автоматически после окончания трека.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        selection = self.next_shuffled_track() if self.shuffle_enabled else self.next_listed_track()
+        if selection is not None:
+            self.play_selected_file(selection[0].path, selection[1])
+
+    def on_track_loaded(self, _):
+        """Метод переходит к сохраненной позиции, когда восстановленный трек загружен.
+
+        Args:
+            _ (Any): Игнорируемый аргумент
+        """
+        if self.pending_seek:
+            self.current_track.seek(self.pending_seek)
+        self.pending_seek = None
 
     def change_current_text_position(self, e):
         """Метод обновляет текстовый элемент, отображающий текущее время воспроизведения.
@@ -798,8 +1518,10 @@ class AudioPlayer:
         Args:
             event (flet.Event): Событие, содержащее информацию о текущем времени воспроизведения.
         """
-        self.current_text_position.value = int(e.data) // 1000
+        self.current_position = int(e.data)
+        self.current_text_position.value = self.current_position // 1000
         self.current_text_position.update()
+        self.schedule_session_save()
 
     def set_speed_025(self, _):
         """Метод устанавливает скорость воспроизведения равную x0.25 от нормальной.
@@ -809,6 +1531,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 0.25
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_050(self, _):
         """Метод устанавливает скорость воспроизведения равную x0.5 от нормальной.
@@ -818,6 +1541,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 0.5
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_075(self, _):
         """Метод устанавливает скорость воспроизведения равную x0.75 от нормальной.
@@ -827,6 +1551,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 0.75
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_100(self, _):
         """Метод устанавливает скорость воспроизведения равную x1 от нормальной.
@@ -836,6 +1561,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 1
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_125(self, _):
         """Метод устанавливает скорость воспроизведения равную x1.25 от нормальной.
@@ -845,6 +1571,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 1.25
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_150(self, _):
         """Метод устанавливает скорость воспроизведения равную x1.5 от нормальной.
@@ -854,6 +1581,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 1.5
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_175(self, _):
         """Метод устанавливает скорость воспроизведения равную x1.75 от нормальной.
@@ -863,6 +1591,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 1.75
         self.current_track.update()
+        self.schedule_session_save()
 
     def set_speed_200(self, _):
         """Метод устанавливает скорость воспроизведения равную x2 от нормальной.
@@ -872,6 +1601,7 @@ class AudioPlayer:
         """
         self.current_track.playback_rate = 2
         self.current_track.update()
+        self.schedule_session_save()
 
     def volume_down(self, _):
         """Метод уменьшает уровень громкости на 10%.
@@ -882,6 +1612,7 @@ class AudioPlayer:
         if self.current_track.volume > 0:
             self.current_track.volume -= 0.1
             self.current_track.update()
+            self.schedule_session_save()
 
     def volume_up(self, _):
         """Метод увеличивает уровень громкости на 10%.
@@ -892,3 +1623,4 @@ class AudioPlayer:
         if self.current_track.volume < 1:
             self.current_track.volume += 0.1
             self.current_track.update()
+            self.schedule_session_save()
@@ -0,0 +1,156 @@
+import base64
+import mmap
+import os
+import struct
+import threading
+
+from cache import ByteLRUCache
+from settings import Preview
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def parse_wav_header(buffer):
+    """Разбор заголовка PCM WAV файла.
+
+    Просматриваются только заголовки блоков RIFF, сами отсчеты не читаются.
+
+    Args:
+        buffer (mmap.mmap | bytes): Содержимое файла.
+
+    Returns:
+        tuple[int, int, int, int, int, int] | None: Количество каналов, частота дискретизации, размер кадра в байтах,
+            разрядность, смещение и размер блока отсчетов или None, если файл не является PCM WAV.
+    """
+    if len(buffer) < 12 or buffer[0:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(buffer):
+        chunk_id = buffer[offset : offset + 4]
+        (chunk_size,) = struct.unpack("<I", buffer[offset + 4 : offset + 8])
+        body = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            format_tag, channels, rate, _, block_align, bits = struct.unpack("<HHIIHH", buffer[body : body + 16])
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # Для WAVE_FORMAT_EXTENSIBLE настоящий формат записан в начале GUID подформата.
+                (format_tag,) = struct.unpack("<H", buffer[body + 24 : body + 26])
+            if format_tag != WAVE_FORMAT_PCM or not block_align:
+                return None
+            fmt = (channels, rate, block_align, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            # Некоторые программы записывают размер блока данных неверно, поэтому он ограничивается размером файла.
+            size = min(chunk_size, len(buffer) - body)
+            return (*fmt, body, size - size % fmt[2])
+        offset = body + chunk_size + chunk_size % 2
+    return None
+
+
+def make_wav_header(channels, rate, block_align, bits, data_size):
+    """Создание 44-байтного заголовка PCM WAV файла.
+
+    Args:
+        channels (int): Количество каналов.
+        rate (int): Частота дискретизации.
+        block_align (int): Размер кадра в байтах.
+        bits (int): Разрядность отсчетов.
+        data_size (int): Размер блока отсчетов в байтах.
+
+    Returns:
+        bytes: Заголовок файла.
+    """
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, channels, rate, rate * block_align, block_align, bits,
+        b"data", data_size,
+    )
+
+
+def slice_wav(file_path, seconds=Preview.seconds):
+    """Вырезание фрагмента из середины PCM WAV файла.
+
+    Файл отображается в память, и в результат копируются только кадры нужного фрагмента,
+    поэтому время не зависит от длины трека, а отсчеты не декодируются.
+
+    Args:
+        file_path (str): Путь к аудиофайлу.
+        seconds (float): Длительность фрагмента в секундах.
+
+    Returns:
+        bytes | None: Фрагмент в виде отдельного WAV файла или None, если файл не является PCM WAV.
+    """
+    try:
+        with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            header = parse_wav_header(buffer)
+            if header is None:
+                return None
+            channels, rate, block_align, bits, data_offset, data_size = header
+            frames = data_size // block_align
+            count = min(frames, int(seconds * rate))
+            start = data_offset + (frames - count) // 2 * block_align
+            return make_wav_header(channels, rate, block_align, bits, count * block_align) + buffer[
+                start : start + count * block_align
+            ]
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+class PreviewStore:
+    """Класс для хранения фрагментов треков для предпрослушивания.
+
+    Фрагменты хранятся в LRU-кэше в памяти, ограниченном по размеру в байтах, в виде строк base64,
+    готовых для 'ft.Audio'. Ключом служит путь к файлу вместе со временем его изменения, поэтому
+    измененный файл вырезается заново.
+
+    Attributes:
+        memory_cache (ByteLRUCache): Кэш фрагментов в памяти.
+    """
+    def __init__(self, memory_limit=Preview.memory_limit):
+        """Конструктор класса `PreviewStore`.
+
+        Args:
+            memory_limit (int): Лимит кэша в памяти в байтах.
+        """
+        self.memory_cache = ByteLRUCache(memory_limit)
+
+    def get_base64(self, file_path):
+        """Метод возвращает фрагмент трека для предпрослушивания в виде строки base64.
+
+        Args:
+            file_path (str): Путь к аудиофайлу.
+
+        Returns:
+            str | None: Строка base64 с WAV файлом или None, если файл не является PCM WAV.
+        """
+        try:
+            key = (file_path, os.stat(file_path).st_mtime_ns)
+        except OSError:
+            return None
+        encoded = self.memory_cache.get(key)
+        if encoded is not None:
+            return encoded
+        data = slice_wav(file_path)
+        if data is None:
+            return None
+        encoded = base64.b64encode(data).decode("ascii")
+        self.memory_cache.put(key, encoded)
+        return encoded
+
+
+_preview_store = None
+_preview_store_lock = threading.Lock()
+
+
+def get_preview_store():
+    """Функция возвращает общий для всего процесса экземпляр `PreviewStore`.
+
+    Returns:
+        PreviewStore: Хранилище фрагментов для предпрослушивания.
+    """
+    global _preview_store
+    with _preview_store_lock:
+        if _preview_store is None:
+            _preview_store = PreviewStore()
+        return _preview_store
@@ -0,0 +1,203 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+from db import make_display_name
+from settings import Search
+
+WORD_PATTERN = re.compile(r"\w+")
+EMPTY = frozenset()
+
+
+def trigrams(text):
+    """Получение множества триграмм строки.
+
+    Строка приводится к нижнему регистру и разбивается на слова. Каждое слово дополняется
+    двумя пробелами в начале и одним в конце, поэтому начало слова весит больше, чем середина.
+
+    Args:
+        text (str): Исходная строка.
+
+    Returns:
+        set[str]: Множество триграмм.
+    """
+    result = set()
+    for word in WORD_PATTERN.findall(text.casefold()):
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def track_terms(track):
+    """Получение значений трека, по которым выполняется поиск.
+
+    Args:
+        track (Track): Трек из общей библиотеки.
+
+    Returns:
+        set[str]: Имя файла без расширения, исполнитель, альбом и жанр.
+    """
+    filename = track.display_name or make_display_name(track.path)
+    return {value for value in (filename, track.artist, track.album, track.genre) if value}
+
+
+class TrigramIndex:
+    """Триграммный индекс для нечеткого поиска треков.
+
+    Индексируются не треки, а различающиеся значения полей (имена файлов, исполнители, альбомы, жанры),
+    поэтому исполнитель, который встречается у тысячи треков, хранится в индексе один раз.
+    Индекс обновляется по одному треку при добавлении, удалении и изменении.
+
+    Attributes:
+        min_similarity (float): Минимальная доля триграмм запроса, которые должны найтись в значении.
+    """
+    def __init__(self, min_similarity=Search.min_similarity):
+        """Конструктор класса `TrigramIndex`.
+
+        Args:
+            min_similarity (float): Минимальная доля триграмм запроса, которые должны найтись в значении.
+        """
+        self.min_similarity = min_similarity
+        self._term_ids = {}
+        self._term_trigrams = {}
+        self._term_tracks = {}
+        self._postings = {}
+        self._next_term_id = 0
+
+    def add_track(self, track):
+        """Метод добавляет трек в индекс.
+
+        Args:
+            track (Track): Трек из общей библиотеки.
+        """
+        for term in track_terms(track):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._next_term_id
+                self._next_term_id += 1
+                self._term_ids[term] = term_id
+                term_trigrams = trigrams(term)
+                size = len(term_trigrams)
+                self._term_trigrams[term_id] = (term, size)
+                self._term_tracks[term_id] = set()
+                for trigram in term_trigrams:
+                    self._postings.setdefault(trigram, {}).setdefault(size, set()).add(term_id)
+            self._term_tracks[term_id].add(track.id)
+
+    def remove_track(self, track):
+        """Метод удаляет трек из индекса.
+
+        Значения, которые больше не встречаются ни у одного трека, удаляются из индекса.
+
+        Args:
+            track (Track): Трек в том виде, в котором он был добавлен в индекс.
+        """
+        for term in track_terms(track):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            tracks = self._term_tracks[term_id]
+            tracks.discard(track.id)
+            if tracks:
+                continue
+            del self._term_ids[term]
+            del self._term_tracks[term_id]
+            _, size = self._term_trigrams.pop(term_id)
+            for trigram in trigrams(term):
+                posting = self._postings.get(trigram)
+                if posting is None or size not in posting:
+                    continue
+                posting[size].discard(term_id)
+                if not posting[size]:
+                    del posting[size]
+                    if not posting:
+                        del self._postings[trigram]
+
+    def update_track(self, old_track, new_track):
+        """Метод обновляет трек в индексе после изменения его метаданных.
+
+        Args:
+            old_track (Track): Трек до изменения.
+            new_track (Track): Трек после изменения.
+        """
+        self.remove_track(old_track)
+        self.add_track(new_track)
+
+    def search(self, query, limit=Search.limit, max_candidates=Search.max_candidates):
+        """Метод ищет треки, значения которых похожи на запрос.
+
+        Для каждого значения считается доля триграмм запроса, которые в нем есть. Значение подходит,
+        если эта доля не меньше 'min_similarity', поэтому опечатки в нескольких символах не мешают поиску.
+        Среди значений с одинаковой долей выше стоят более короткие, то есть более похожие на запрос целиком.
+
+        Списки значений по триграммам разделены по количеству триграмм в значении, и значения проверяются
+        от коротких к длинным. Как только найдено 'limit' значений со всеми триграммами запроса, более длинные
+        значения уже не могут попасть в результат, и поиск заканчивается. Для частых слов это избавляет
+        от перебора десятков тысяч значений. Если значений со всеми триграммами мало, например при опечатке,
+        проверка длинных значений прекращается после 'max_candidates' кандидатов.
+
+        В каждой группе кандидаты собираются только из самых редких списков: значение, которое набирает нужную
+        долю, обязательно встречается хотя бы в одном из них. Остальные списки используются только для проверки
+        уже найденных кандидатов.
+
+        Args:
+            query (str): Строка поиска.
+            limit (int): Максимальное количество треков в результате.
+            max_candidates (int): Количество кандидатов, после которого длинные значения не проверяются.
+
+        Returns:
+            list[int]: Идентификаторы треков по убыванию сходства. Пустой список, если в запросе меньше
+                'Search.min_query_length' символов.
+        """
+        query_trigrams = trigrams(query)
+        if len(query.strip()) < Search.min_query_length or not query_trigrams:
+            return []
+        query_size = len(query_trigrams)
+        required = max(1, math.ceil(self.min_similarity * query_size))
+        prefix_size = query_size - required + 1
+        postings = [self._postings.get(trigram, {}) for trigram in query_trigrams]
+
+        sizes = sorted(size for size in set().union(*postings) if size >= required)
+        groups_by_size = [
+            (size, sorted((posting.get(size, EMPTY) for posting in postings), key=len)) for size in sizes
+        ]
+
+        # Значения со всеми триграммами запроса стоят выше остальных, а среди них короткие выше длинных.
+        matches = []
+        for size, groups in groups_by_size:
+            if groups[0]:
+                matches.extend((1.0, query_size / size, term_id) for term_id in groups[0].intersection(*groups[1:]))
+                if len(matches) >= limit:
+                    break
+        else:
+            checked = 0
+            for size, groups in groups_by_size:
+                if checked and checked + sum(map(len, groups[:prefix_size])) > max_candidates:
+                    break
+                counts = Counter()
+                for group in groups[:prefix_size]:
+                    counts.update(group)
+                for group in groups[prefix_size:]:
+                    if group:
+                        counts.update(group.intersection(counts))
+                matches.extend(
+                    (shared / query_size, shared / (query_size + size - shared), term_id)
+                    for term_id, shared in counts.items()
+                    if required <= shared < query_size
+                )
+                checked += len(counts)
+
+        # У каждого значения есть хотя бы один трек, поэтому достаточно 'limit' лучших значений.
+        ranked_terms = heapq.nlargest(limit, matches)
+
+        result = []
+        seen = set()
+        for _, _, term_id in ranked_terms:
+            for track_id in self._term_tracks[term_id]:
+                if track_id not in seen:
+                    seen.add(track_id)
+                    result.append(track_id)
+                    if len(result) >= limit:
+                        return result
+        return result
@@ -4,6 +4,132 @@ class Colors:
     Attributes:
         black (str): Черный цвет
         green (str): Зеленый цвет
+        red (str): Красный цвет
     """
     black = "#000000"
-    green = "#006642"
\ No newline at end of file
+    green = "#006642"
+    red = "#B00020"
+
+class Artwork:
+    """Класс для хранения настроек кэша обложек.
+
+    Attributes:
+        cache_dir (str): Каталог дискового кэша обложек.
+        memory_limit (int): Лимит кэша обложек в памяти в байтах.
+        thumbnail_size (int): Размер стороны миниатюры в пикселях.
+        row_height (int): Высота строки в списке треков в пикселях, используется для расчёта видимых строк.
+    """
+    cache_dir = "artwork_cache"
+    memory_limit = 8 * 1024 * 1024
+    thumbnail_size = 128
+    row_height = 50
+
+
+class Server:
+    """Класс для хранения настроек локального сервера потоковой передачи аудио.
+
+    Attributes:
+        host (str): Адрес, на котором сервер принимает подключения. По умолчанию сервер доступен только
+            на этом компьютере. Чтобы открыть библиотеку другим устройствам в локальной сети, например
+            при запуске приложения в режиме веб-сервера, укажите "0.0.0.0".
+        port (int): Порт сервера.
+        public_host (str | None): Адрес сервера для клиентов. Если не задан, используется адрес из host,
+            а для "0.0.0.0" определяется адрес компьютера в локальной сети.
+    """
+    host = "127.0.0.1"
+    port = 8765
+    public_host = None
+
+
+class Search:
+    """Класс для хранения настроек поиска.
+
+    Attributes:
+        debounce (float): Задержка перед поиском после ввода символа в секундах.
+        limit (int): Максимальное количество результатов поиска.
+        min_similarity (float): Минимальная доля триграмм запроса, которые должны найтись в значении.
+        min_query_length (int): Минимальная длина строки поиска. По более коротким строкам поиск не выполняется:
+            с одной буквы начинается слишком большая часть библиотеки.
+        max_candidates (int): Количество проверенных значений, после которого поиск не проверяет более длинные значения.
+    """
+    debounce = 0.15
+    limit = 100
+    min_similarity = 0.5
+    min_query_length = 2
+    max_candidates = 5000
+
+
+class Analysis:
+    """Класс для хранения настроек анализа аудио.
+
+    Attributes:
+        max_seconds (float): Длительность фрагмента из середины трека, который анализируется, в секундах.
+        frame_size (int): Размер окна спектрального анализа в отсчетах.
+        hop_size (int): Шаг окна спектрального анализа в отсчетах.
+        bands (int): Количество мел-полос.
+        coefficients (int): Количество коэффициентов, похожих на MFCC.
+        similar_limit (int): Количество похожих треков в результате.
+    """
+    max_seconds = 60.0
+    frame_size = 2048
+    hop_size = 1024
+    bands = 26
+    coefficients = 13
+    similar_limit = 30
+
+
+class Jobs:
+    """Класс для хранения настроек очереди фоновых задач.
+
+    Attributes:
+        max_workers (int | None): Количество процессов, в которых выполняются задачи. None означает количество процессоров.
+        max_attempts (int): Количество попыток выполнить задачу, после которого она считается неудачной.
+        poll_interval (float): Интервал проверки новых задач в секундах, если очередь пуста.
+        max_boosts (int): Количество треков, для которых запоминается повышенный приоритет видимых и текущих треков.
+    """
+    max_workers = None
+    max_attempts = 3
+    poll_interval = 1.0
+    max_boosts = 1000
+
+
+class Preview:
+    """Класс для хранения настроек предпрослушивания треков.
+
+    Attributes:
+        seconds (float): Длительность фрагмента из середины трека в секундах.
+        memory_limit (int): Лимит кэша фрагментов в памяти в байтах.
+        hover_delay (float): Задержка перед началом предпрослушивания после наведения на трек в секундах.
+    """
+    seconds = 10.0
+    memory_limit = 32 * 1024 * 1024
+    hover_delay = 0.05
+
+
+class Health:
+    """Класс для хранения настроек проверки доступности файлов библиотеки.
+
+    Attributes:
+        max_workers (int): Количество потоков проверки.
+        batch_size (int): Количество результатов, которые записываются в базу данных за один раз.
+    """
+    max_workers = 32
+    batch_size = 1000
+
+
+class Session:
+    """Класс для хранения настроек сохранения состояния сессии плеера.
+
+    Attributes:
+        save_delay (float): Задержка перед записью состояния в секундах. Изменения за это время записываются одной операцией.
+    """
+    save_delay = 2.0
+
+
+class Shuffle:
+    """Класс для хранения настроек случайного порядка воспроизведения.
+
+    Attributes:
+        lookahead (int): Количество следующих треков, из которых выбирают взвешенные режимы перемешивания.
+    """
+    lookahead = 8
@@ -0,0 +1,153 @@
+import random
+
+from settings import Shuffle
+
+MODE_RANDOM = "random"
+MODE_FAVOR_UNPLAYED = "favor_unplayed"
+MODE_AVOID_SAME_ARTIST = "avoid_same_artist"
+MODES = (MODE_RANDOM, MODE_FAVOR_UNPLAYED, MODE_AVOID_SAME_ARTIST)
+
+
+class Permutation:
+    """Случайная перестановка чисел от 0 до size - 1, которая строится по одному числу за шаг.
+
+    Числа порождаются линейным конгруэнтным генератором по модулю ближайшей степени двойки, не меньшей size.
+    Множитель, сравнимый с 1 по модулю 4, и нечетное приращение дают полный период, то есть каждое число
+    по этому модулю встречается ровно один раз. Выход генератора дополнительно перемешивается обратимыми
+    операциями, чтобы соседние числа не чередовали четность, а числа, не меньшие size, пропускаются.
+    Модуль меньше 2 * size, поэтому в среднем пропускается меньше одного числа за шаг, а состояние
+    перестановки занимает несколько целых чисел независимо от size.
+
+    Attributes:
+        size (int): Количество чисел в перестановке.
+        modulus (int): Модуль генератора.
+    """
+    def __init__(self, size, seed=None):
+        """Конструктор класса `Permutation`.
+
+        Args:
+            size (int): Количество чисел в перестановке.
+            seed (int | None): Начальное значение генератора. Одинаковое значение дает одинаковую перестановку.
+        """
+        rng = random.Random(seed)
+        self.size = size
+        self.bits = max(2, (size - 1).bit_length())
+        self.modulus = 1 << self.bits
+        self._mask = self.modulus - 1
+        self._multiplier = 4 * rng.randrange(1, self.modulus // 4 + 1) + 1 & self._mask
+        self._increment = rng.randrange(self.modulus) | 1
+        self._mixer = rng.randrange(self.modulus) | 1
+        self._state = rng.randrange(self.modulus)
+        self._steps = 0
+
+    def _mix(self, value):
+        # Сдвиг с исключающим ИЛИ и умножение на нечетное число обратимы по модулю степени двойки.
+        shift = self.bits // 2 + 1
+        value ^= value >> shift
+        value = value * self._mixer & self._mask
+        return value ^ value >> shift
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """Метод возвращает следующее число перестановки.
+
+        Returns:
+            int: Число от 0 до size - 1, которое еще не возвращалось.
+
+        Raises:
+            StopIteration: Если все числа уже возвращены.
+        """
+        while self._steps < self.modulus:
+            value = self._mix(self._state)
+            self._state = (self._state * self._multiplier + self._increment) & self._mask
+            self._steps += 1
+            if value < self.size:
+                return value
+        raise StopIteration
+
+
+class Shuffler:
+    """Случайный порядок воспроизведения без повторов по плейлисту или всей библиотеке.
+
+    Порядок задается перестановкой `Permutation` позиций источника, а трек по позиции запрашивается
+    функцией `get_track`, поэтому список треков не копируется и не перемешивается целиком. Позиции,
+    для которых трека нет, например удаленные, пропускаются. Когда перестановка заканчивается,
+    начинается новая с другим начальным значением.
+
+    Взвешенные режимы выбирают трек из небольшого буфера следующих позиций перестановки:
+    'MODE_FAVOR_UNPLAYED' выбирает реже всего воспроизводимый трек, 'MODE_AVOID_SAME_ARTIST' выбирает
+    трек другого исполнителя, чем у предыдущего. Остальные треки остаются в буфере, поэтому каждый трек
+    по-прежнему воспроизводится один раз за проход.
+
+    Attributes:
+        size (int): Количество позиций источника.
+        mode (str): Режим выбора, одно из значений 'MODES'.
+    """
+    def __init__(self, size, get_track, mode=MODE_RANDOM, play_count=None, seed=None, lookahead=Shuffle.lookahead):
+        """Конструктор класса `Shuffler`.
+
+        Args:
+            size (int): Количество позиций источника.
+            get_track (Callable[[int], Track | None]): Функция, которая возвращает трек по позиции или None.
+            mode (str): Режим выбора, одно из значений 'MODES'.
+            play_count (Callable[[int], int] | None): Функция, которая возвращает количество воспроизведений трека
+                по идентификатору. Нужна для режима 'MODE_FAVOR_UNPLAYED'.
+            seed (int | None): Начальное значение генератора.
+            lookahead (int): Размер буфера взвешенных режимов.
+
+        Raises:
+            ValueError: Если режим неизвестен.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим перемешивания: {mode}")
+        self.size = size
+        self.mode = mode
+        self._get_track = get_track
+        self._play_count = play_count or (lambda _: 0)
+        self._rng = random.Random(seed)
+        self._lookahead = 1 if mode == MODE_RANDOM else max(1, lookahead)
+        self._permutation = Permutation(size, self._rng.getrandbits(64))
+        self._buffer = []
+        self._previous = None
+
+    def _fill(self, skip):
+        # За один вызов перестановка начинается заново не больше одного раза, чтобы пустой источник не зациклил поиск.
+        restarted = False
+        while len(self._buffer) < self._lookahead:
+            try:
+                position = next(self._permutation)
+            except StopIteration:
+                if restarted or self._buffer:
+                    return
+                restarted = True
+                self._permutation = Permutation(self.size, self._rng.getrandbits(64))
+                continue
+            track = self._get_track(position)
+            if track is not None and not skip(track):
+                self._buffer.append(track)
+
+    def next_track(self, skip=lambda track: False):
+        """Метод возвращает следующий трек в случайном порядке.
+
+        Args:
+            skip (Callable[[Track], bool]): Функция, которая возвращает True для треков, которые нужно пропустить,
+                например недоступных.
+
+        Returns:
+            Track | None: Следующий трек или None, если в источнике нет подходящих треков.
+        """
+        self._fill(skip)
+        if not self._buffer:
+            return None
+        if self.mode == MODE_FAVOR_UNPLAYED:
+            index = min(range(len(self._buffer)), key=lambda i: self._play_count(self._buffer[i].id))
+        elif self.mode == MODE_AVOID_SAME_ARTIST and self._previous is not None:
+            index = next(
+                (i for i, track in enumerate(self._buffer) if track.artist != self._previous.artist), 0
+            )
+        else:
+            index = 0
+        self._previous = self._buffer.pop(index)
+        return self._previous
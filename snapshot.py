@@ -0,0 +1,289 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+
+from db import get_facet_ids, init_db, load_facet_ids, refresh_facet_counts, refresh_sort_keys
+
+SNAPSHOT_FORMAT = "audioplayer-snapshot"
+SNAPSHOT_VERSION = 1
+BATCH_SIZE = 5000
+
+
+def encode_value(value):
+    """Преобразование значения из базы данных в значение, которое можно записать в JSON.
+
+    Args:
+        value (Any): Значение столбца.
+
+    Returns:
+        Any: Исходное значение или словарь с данными BLOB в base64.
+    """
+    if isinstance(value, bytes):
+        return {"b": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def decode_value(value):
+    """Обратное преобразование значения, записанного функцией `encode_value`.
+
+    Args:
+        value (Any): Значение из снимка.
+
+    Returns:
+        Any: Значение столбца.
+    """
+    if isinstance(value, dict):
+        return base64.b64decode(value["b"])
+    return value
+
+
+def list_tables(connection):
+    """Получение списка пользовательских таблиц и их столбцов.
+
+    Args:
+        connection (sqlite3.Connection): Соединение с базой данных.
+
+    Returns:
+        dict[str, list[str]]: Столбцы по названию таблицы.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    tables = {}
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"PRAGMA table_info({table})")
+        tables[table] = [row[1] for row in cursor.fetchall()]
+    return tables
+
+
+def export_snapshot(snapshot_path, db_path="audio_history.db"):
+    """Экспорт всей библиотеки в сжатый снимок.
+
+    Сначала база данных копируется через API онлайн-резервного копирования SQLite, поэтому экспорт
+    не блокирует работающее приложение и видит согласованное состояние. Затем строки всех таблиц
+    построчно записываются в файл gzip: первая строка содержит заголовок с версией формата и
+    столбцами таблиц, каждая следующая — одну запись '[номер таблицы, значения...]'.
+    Строки читаются курсором по одной, поэтому расход памяти не зависит от размера библиотеки.
+
+    Args:
+        snapshot_path (str): Путь к файлу снимка.
+        db_path (str): Путь к файлу базы данных.
+
+    Returns:
+        int: Количество записанных строк.
+    """
+    handle, copy_path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    try:
+        source = sqlite3.connect(db_path)
+        copy = sqlite3.connect(copy_path)
+        source.backup(copy)
+        source.close()
+
+        tables = list_tables(copy)
+        count = 0
+        with gzip.open(snapshot_path, "wt", encoding="utf-8") as file:
+            header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "tables": tables}
+            file.write(json.dumps(header, separators=(",", ":")) + "\n")
+            for table_number, (table, columns) in enumerate(tables.items()):
+                cursor = copy.execute(f"SELECT {', '.join(columns)} FROM {table}")
+                for row in cursor:
+                    record = [table_number, *map(encode_value, row)]
+                    file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    count += 1
+        copy.close()
+        return count
+    finally:
+        os.remove(copy_path)
+
+
+def remap_path(path, path_prefixes):
+    """Замена префикса пути к файлу.
+
+    Args:
+        path (str): Исходный путь.
+        path_prefixes (dict[str, str]): Новые префиксы по старым.
+
+    Returns:
+        str: Путь с замененным префиксом или исходный путь, если ни один префикс не подошел.
+    """
+    for old_prefix, new_prefix in path_prefixes.items():
+        if path.startswith(old_prefix):
+            return new_prefix + path[len(old_prefix) :]
+    return path
+
+
+def read_snapshot(snapshot_path):
+    """Чтение заголовка и записей снимка.
+
+    Args:
+        snapshot_path (str): Путь к файлу снимка.
+
+    Returns:
+        tuple[dict, Iterator[list]]: Заголовок снимка и итератор по записям.
+
+    Raises:
+        ValueError: Если файл не является снимком или его версия не поддерживается.
+    """
+    file = gzip.open(snapshot_path, "rt", encoding="utf-8")
+    try:
+        header = json.loads(file.readline() or "{}")
+    except (OSError, ValueError):
+        header = {}
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        file.close()
+        raise ValueError("Файл не является снимком библиотеки")
+    if header.get("version", 0) > SNAPSHOT_VERSION:
+        file.close()
+        raise ValueError(f"Неподдерживаемая версия снимка: {header.get('version')}")
+
+    def records():
+        with file:
+            for line in file:
+                yield json.loads(line)
+
+    return header, records()
+
+
+def restore_snapshot(snapshot_path, db_path="audio_history.db", path_prefixes=None):
+    """Восстановление библиотеки из снимка.
+
+    Содержимое таблиц, которые есть в снимке, заменяется целиком. Загрузка идет одной транзакцией
+    пакетами по 'BATCH_SIZE' строк, а пользовательские индексы и триггеры этих таблиц удаляются перед загрузкой
+    и создаются заново после нее, чтобы не перестраивать их на каждой вставке. Счетчики треков
+    у исполнителей, альбомов и жанров пересчитываются в конце загрузки.
+    Столбцы, которых нет в текущей схеме, пропускаются. Исполнитель, альбом и жанр из снимков,
+    где они хранятся строками в 'audio_history', переносятся в таблицы 'artists', 'albums' и 'genres'.
+
+    Args:
+        snapshot_path (str): Путь к файлу снимка.
+        db_path (str): Путь к файлу базы данных. Схема должна быть уже создана функцией 'init_db'.
+        path_prefixes (dict[str, str] | None): Новые префиксы путей к аудиофайлам по старым.
+
+    Returns:
+        int: Количество загруженных строк.
+    """
+    header, records = read_snapshot(snapshot_path)
+    path_prefixes = path_prefixes or {}
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    cursor = connection.cursor()
+    current_tables = list_tables(connection)
+
+    plans = []
+    facet_positions = None
+    for table, columns in header["tables"].items():
+        if table not in current_tables:
+            plans.append(None)
+            continue
+        positions = [i for i, column in enumerate(columns) if column in current_tables[table]]
+        kept_columns = [columns[i] for i in positions]
+        path_position = kept_columns.index("path") if table == "audio_history" and "path" in kept_columns else None
+        if table == "audio_history" and "artist" in columns and "artist_id" in current_tables[table]:
+            facet_positions = [columns.index(column) for column in ("artist", "album", "genre")]
+            kept_columns += ["artist_id", "album_id", "genre_id"]
+        sql = f"INSERT INTO {table} ({', '.join(kept_columns)}) VALUES ({', '.join('?' * len(kept_columns))})"
+        plans.append((table, positions, path_position, sql))
+    tables = [plan[0] for plan in plans if plan is not None]
+
+    placeholders = ", ".join("?" * len(tables))
+    cursor.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        f"WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        tables,
+    )
+    schema_objects = cursor.fetchall()
+
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    count = 0
+    try:
+        cursor.execute("BEGIN")
+        for object_type, name, _ in schema_objects:
+            cursor.execute(f"DROP {object_type} {name}")
+        for table in tables:
+            cursor.execute(f"DELETE FROM {table}")
+        if "sqlite_sequence" in [row[0] for row in cursor.execute("SELECT name FROM sqlite_master")]:
+            cursor.execute(f"DELETE FROM sqlite_sequence WHERE name IN ({placeholders})", tables)
+        facet_ids = load_facet_ids(cursor) if facet_positions is not None else None
+
+        current_plan = None
+        batch = []
+        for record in records:
+            plan = plans[record[0]]
+            if plan is None:
+                continue
+            if plan is not current_plan:
+                if batch:
+                    cursor.executemany(current_plan[3], batch)
+                    count += len(batch)
+                    batch = []
+                current_plan = plan
+            _, positions, path_position, _ = plan
+            values = [decode_value(record[i + 1]) for i in positions]
+            if path_position is not None and values[path_position]:
+                values[path_position] = remap_path(values[path_position], path_prefixes)
+            if facet_positions is not None and plan[0] == "audio_history":
+                facet_values = [record[i + 1] for i in facet_positions]
+                values.extend(get_facet_ids(cursor, facet_ids, *facet_values))
+            batch.append(values)
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(plan[3], batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(current_plan[3], batch)
+            count += len(batch)
+
+        for _, _, sql in schema_objects:
+            cursor.execute(sql)
+        if "audio_history" in tables and "artists" in current_tables:
+            refresh_facet_counts(cursor)
+            refresh_sort_keys(cursor)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.execute("PRAGMA synchronous = FULL")
+        connection.close()
+    return count
+
+
+def parse_prefix(value):
+    """Разбор аргумента командной строки вида 'СТАРЫЙ=НОВЫЙ'.
+
+    Args:
+        value (str): Значение аргумента.
+
+    Returns:
+        tuple[str, str]: Старый и новый префиксы.
+    """
+    old_prefix, separator, new_prefix = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError("Ожидается значение вида СТАРЫЙ=НОВЫЙ")
+    return old_prefix, new_prefix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экспорт и восстановление библиотеки аудиоплеера.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Экспорт библиотеки в снимок")
+    export_parser.add_argument("snapshot")
+    import_parser = subparsers.add_parser("import", help="Восстановление библиотеки из снимка")
+    import_parser.add_argument("snapshot")
+    import_parser.add_argument(
+        "--remap", type=parse_prefix, action="append", default=[],
+        metavar="СТАРЫЙ=НОВЫЙ", help="Замена префикса путей к аудиофайлам",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.command == "export":
+        print(f"Экспортировано строк: {export_snapshot(arguments.snapshot)}")
+    else:
+        init_db()
+        print(f"Восстановлено строк: {restore_snapshot(arguments.snapshot, path_prefixes=dict(arguments.remap))}")
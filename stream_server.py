@@ -0,0 +1,289 @@
+import mimetypes
+import os
+import re
+import socket
+import sqlite3
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from settings import Server
+
+TRACK_PATH_PATTERN = re.compile(r"^/tracks/(\d+)$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_track_path(track_id):
+    """Получение пути к аудиофайлу по идентификатору трека из таблицы 'audio_history'.
+
+    Args:
+        track_id (int): Идентификатор трека.
+
+    Returns:
+        str | None: Путь к аудиофайлу или None, если трека нет в базе данных.
+    """
+    connection = sqlite3.connect("audio_history.db")
+    cursor = connection.cursor()
+    cursor.execute("SELECT path FROM audio_history WHERE id = ?", (track_id,))
+    row = cursor.fetchone()
+    connection.close()
+    return row[0] if row else None
+
+
+def parse_range(header, size):
+    """Разбор заголовка HTTP 'Range'.
+
+    Поддерживается один диапазон байтов, в том числе открытый ('bytes=100-') и суффиксный ('bytes=-500').
+    Заголовки с несколькими диапазонами игнорируются, и клиенту отдается весь файл.
+
+    Args:
+        header (str | None): Значение заголовка 'Range'.
+        size (int): Размер файла в байтах.
+
+    Returns:
+        tuple[int, int] | None: Первый и последний байт диапазона включительно или None, если нужно отдать весь файл.
+
+    Raises:
+        ValueError: Если диапазон не пересекается с файлом.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            raise ValueError("Пустой суффиксный диапазон")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("Диапазон за пределами файла")
+    return start, min(end, size - 1)
+
+
+class AudioRequestHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к аудиофайлам библиотеки по адресу '/tracks/<id>'.
+
+    Поддерживает запросы диапазонов байтов, условные запросы по 'ETag' и 'Last-Modified'
+    и передачу файла через 'socket.sendfile', которая использует 'os.sendfile' там, где он доступен.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        """Метод обрабатывает запрос HEAD."""
+        self.send_track(send_body=False)
+
+    def do_GET(self):
+        """Метод обрабатывает запрос GET."""
+        self.send_track(send_body=True)
+
+    def send_track(self, send_body):
+        """Метод отправляет клиенту аудиофайл или его часть.
+
+        Args:
+            send_body (bool): Нужно ли отправлять содержимое файла.
+        """
+        match = TRACK_PATH_PATTERN.match(self.path.split("?", 1)[0])
+        path = self.server.path_resolver(int(match.group(1))) if match else None
+        if not path:
+            self.send_empty_response(HTTPStatus.NOT_FOUND)
+            return
+        try:
+            file = open(path, "rb")
+        except OSError:
+            self.send_empty_response(HTTPStatus.NOT_FOUND)
+            return
+
+        with file:
+            stat = os.fstat(file.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+            if self.is_not_modified(etag, stat.st_mtime):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_cache_headers(etag, last_modified)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if if_range and if_range not in (etag, last_modified):
+                range_header = None
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(HTTPStatus.OK)
+            else:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_cache_headers(etag, last_modified)
+            self.end_headers()
+
+            if send_body and size:
+                try:
+                    self.connection.sendfile(file, start, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент закрыл соединение, например при перемотке.
+                    self.close_connection = True
+
+    def is_not_modified(self, etag, mtime):
+        """Метод проверяет условные заголовки запроса.
+
+        Args:
+            etag (str): Текущий 'ETag' файла.
+            mtime (float): Время последнего изменения файла.
+
+        Returns:
+            bool: True, если у клиента актуальная копия файла.
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_cache_headers(self, etag, last_modified):
+        """Метод отправляет заголовки кэширования и CORS.
+
+        Args:
+            etag (str): 'ETag' файла.
+            last_modified (str): Время последнего изменения файла в формате HTTP.
+        """
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+    def send_empty_response(self, status):
+        """Метод отправляет ответ без содержимого.
+
+        Args:
+            status (http.HTTPStatus): Код ответа.
+        """
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        """Метод отключает вывод журнала запросов в консоль."""
+
+
+class AudioStreamServer(ThreadingHTTPServer):
+    """Многопоточный HTTP-сервер для потоковой передачи треков библиотеки.
+
+    Attributes:
+        path_resolver (Callable[[int], str | None]): Функция, возвращающая путь к файлу по идентификатору трека.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, path_resolver=get_track_path):
+        """Конструктор класса `AudioStreamServer`.
+
+        Args:
+            address (tuple[str, int]): Адрес и порт сервера.
+            path_resolver (Callable[[int], str | None]): Функция, возвращающая путь к файлу по идентификатору трека.
+        """
+        super().__init__(address, AudioRequestHandler)
+        self.path_resolver = path_resolver
+
+
+_server = None
+_server_lock = threading.Lock()
+_public_host = None
+
+
+def start_stream_server(host=Server.host, port=Server.port, path_resolver=get_track_path):
+    """Функция запускает общий для процесса сервер потоковой передачи в фоновом потоке.
+
+    Повторный вызов возвращает уже запущенный сервер.
+
+    Args:
+        host (str): Адрес, на котором сервер принимает подключения.
+        port (int): Порт сервера.
+        path_resolver (Callable[[int], str | None]): Функция, возвращающая путь к файлу по идентификатору трека.
+
+    Returns:
+        AudioStreamServer: Запущенный сервер.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = AudioStreamServer((host, port), path_resolver)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def stop_stream_server():
+    """Функция останавливает сервер потоковой передачи, если он запущен."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
+
+
+def get_public_host():
+    """Функция определяет адрес сервера, по которому к нему могут обратиться клиенты.
+
+    Если сервер принимает подключения на конкретном адресе, возвращается этот адрес. Адрес компьютера
+    в локальной сети определяется, только когда сервер принимает подключения на всех адресах.
+
+    Returns:
+        str: Адрес из настроек, адрес сервера, адрес компьютера в локальной сети или '127.0.0.1'.
+    """
+    global _public_host
+    if Server.public_host:
+        return Server.public_host
+    server = _server
+    if server is not None and server.server_address[0] not in ("0.0.0.0", ""):
+        return server.server_address[0]
+    if _public_host is None:
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                # UDP-сокет не отправляет пакетов, connect только выбирает сетевой интерфейс.
+                probe.connect(("10.255.255.255", 1))
+                _public_host = probe.getsockname()[0]
+        except OSError:
+            _public_host = "127.0.0.1"
+    return _public_host
+
+
+def track_url(track_id):
+    """Функция возвращает адрес трека на сервере потоковой передачи.
+
+    Args:
+        track_id (int): Идентификатор трека.
+
+    Returns:
+        str | None: Адрес трека или None, если сервер не запущен.
+    """
+    if _server is None:
+        return None
+    return f"http://{get_public_host()}:{_server.server_address[1]}/tracks/{track_id}"
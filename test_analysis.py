@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+from analysis import FEATURE_SIZE, SimilarityIndex, analyze_file
+
+
+def write_wav(path, samples, rate=22050):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+
+
+class TestAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        time = np.arange(22050 * 3) / 22050
+        self.paths = {}
+        signals = {
+            "low": np.sin(2 * np.pi * 220 * time),
+            "low_2": np.sin(2 * np.pi * 230 * time),
+            "noise": np.random.default_rng(0).uniform(-1, 1, len(time)),
+        }
+        for name, samples in signals.items():
+            self.paths[name] = os.path.join(self.temp_dir.name, f"{name}.wav")
+            write_wav(self.paths[name], samples * 0.5)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_feature_vector_size(self):
+        vector = np.frombuffer(analyze_file(self.paths["low"]), dtype=np.float32)
+        self.assertEqual(len(vector), FEATURE_SIZE)
+        self.assertTrue(np.all(np.isfinite(vector)))
+
+    def test_unsupported_file(self):
+        self.assertIsNone(analyze_file(os.path.join("music", "silent-wood.mp3")))
+
+    def test_similar_tracks(self):
+        index = SimilarityIndex()
+        for track_id, name in enumerate(["low", "low_2", "noise"], start=1):
+            index.add(track_id, analyze_file(self.paths[name]))
+        self.assertEqual(index.similar(1), [2, 3])
+        index.remove(2)
+        self.assertEqual(index.similar(1), [3])
+        self.assertEqual(index.similar(2), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from artwork import ArtworkStore, make_thumbnail
+from cache import ByteLRUCache
+from settings import Artwork
+
+
+class TestByteLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = ByteLRUCache(10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")
+        cache.put("c", b"12345")
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.current_bytes, 10)
+
+    def test_skips_values_larger_than_limit(self):
+        cache = ByteLRUCache(4)
+        cache.put("a", b"12345")
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.current_bytes, 0)
+
+
+class TestMakeThumbnail(unittest.TestCase):
+    def test_large_cover_is_reduced(self):
+        output = io.BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(output, format="PNG")
+        thumbnail = make_thumbnail(output.getvalue())
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (Artwork.thumbnail_size, Artwork.thumbnail_size * 2 // 3))
+        self.assertLess(len(thumbnail), len(output.getvalue()))
+
+    def test_unreadable_cover_is_kept(self):
+        self.assertEqual(make_thumbnail(b"not an image"), b"not an image")
+
+
+class TestArtworkStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = ArtworkStore(cache_dir=self.temp_dir.name, memory_limit=1024)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_same_cover_is_stored_once(self):
+        with patch("artwork.extract_cover", return_value=b"cover"):
+            first_hash = self.store.save_cover("first.mp3")
+            second_hash = self.store.save_cover("second.mp3")
+        self.assertEqual(first_hash, second_hash)
+        self.assertEqual(os.listdir(self.temp_dir.name), [first_hash])
+
+    def test_get_base64_uses_memory_cache(self):
+        with patch("artwork.extract_cover", return_value=b"cover"):
+            cover_hash = self.store.save_cover("first.mp3")
+        self.assertEqual(self.store.get_base64(cover_hash), "Y292ZXI=")
+        os.remove(os.path.join(self.temp_dir.name, cover_hash))
+        self.assertEqual(self.store.get_base64(cover_hash), "Y292ZXI=")
+
+    def test_track_without_cover(self):
+        with patch("artwork.extract_cover", return_value=None):
+            self.assertIsNone(self.store.save_cover("first.mp3"))
+        self.assertIsNone(self.store.get_base64(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
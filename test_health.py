@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from db import init_db
+from health import STATUS_MISSING, STATUS_OK, STATUS_UNPARSEABLE, check_file, scan_library
+from library import Library
+
+
+class TestHealth(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.music_path = os.path.join(self.temp_dir.name, "song.mp3")
+        self.missing_path = os.path.join(self.temp_dir.name, "missing.mp3")
+        shutil.copy(os.path.join("music", "silent-wood.mp3"), self.music_path)
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+
+    def tearDown(self):
+        self.library.close()
+        self.temp_dir.cleanup()
+
+    def test_check_file(self):
+        unparseable_path = os.path.join(self.temp_dir.name, "track.xyz")
+        with open(unparseable_path, "wb") as file:
+            file.write(b"data")
+        self.assertEqual(check_file(self.music_path), STATUS_OK)
+        self.assertEqual(check_file(self.missing_path), STATUS_MISSING)
+        self.assertEqual(check_file(unparseable_path), STATUS_UNPARSEABLE)
+
+    def test_scan_library_writes_changed_statuses(self):
+        self.library.add_track(self.music_path, "Artist", "Album", "Genre")
+        self.library.add_track(self.missing_path, "Artist", "Album", "Genre")
+        self.assertEqual(scan_library(self.library, batch_size=1), 2)
+        self.assertEqual(scan_library(self.library), 0)
+
+        reloaded = Library(self.db_path)
+        self.assertEqual(
+            [track.status for track in reloaded.all_tracks()], [STATUS_OK, STATUS_MISSING]
+        )
+        reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
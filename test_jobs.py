@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from db import init_db
+from jobs import (
+    PRIORITY_PLAYING, STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING, JobScheduler, register_analyzer,
+)
+from library import Library
+from metadata import UNKNOWN_METADATA
+
+MUSIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "music")
+
+saved = []
+
+
+def path_length(file_path):
+    return len(file_path)
+
+
+def fail(file_path):
+    raise RuntimeError(file_path)
+
+
+def save_result(library, track, result):
+    saved.append((track.id, result))
+
+
+register_analyzer("test_length", path_length, save_result)
+register_analyzer("test_fail", fail, save_result)
+register_analyzer("test_mp3", path_length, save_result, accepts=lambda track: track.path.endswith(".mp3"))
+
+
+class TestJobScheduler(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+        self.scheduler = JobScheduler(self.library, self.db_path, max_workers=1, max_attempts=2)
+        self.tracks = [self.library.add_track(path, "Artist", "Album", "Genre") for path in ("a.mp3", "bb.wav", "ccc.mp3")]
+        saved.clear()
+
+    def tearDown(self):
+        self.scheduler.close()
+        self.library.close()
+        self.temp_dir.cleanup()
+
+    def test_finished_jobs_are_not_repeated(self):
+        self.assertEqual(self.scheduler.enqueue_library("test_length"), 3)
+        self.scheduler.run(stop_when_idle=True)
+        self.assertEqual(sorted(saved), [(1, 5), (2, 6), (3, 7)])
+        self.assertEqual(self.scheduler.counts(), {("test_length", STATUS_DONE): 3})
+
+        saved.clear()
+        self.scheduler.enqueue_library("test_length")
+        self.scheduler.run(stop_when_idle=True)
+        self.assertEqual(saved, [])
+
+    def test_accepts_filters_tracks(self):
+        self.assertEqual(self.scheduler.enqueue_library("test_mp3"), 2)
+
+    def test_failed_jobs_are_retried_until_limit(self):
+        self.scheduler.enqueue("test_fail", self.tracks[:1])
+        self.scheduler.run(stop_when_idle=True)
+        self.assertEqual(self.scheduler.counts(), {("test_fail", STATUS_FAILED): 1})
+        self.assertEqual(saved, [])
+
+    def test_running_jobs_are_resumed(self):
+        self.scheduler.enqueue("test_length", self.tracks)
+        self.assertEqual(len(self.scheduler._claim(2)), 2)
+        self.assertEqual(self.scheduler.counts()[("test_length", STATUS_RUNNING)], 2)
+        self.assertEqual(self.scheduler.resume(), 2)
+        self.assertEqual(self.scheduler.counts(), {("test_length", STATUS_PENDING): 3})
+
+    def test_priority_and_boost(self):
+        self.scheduler.enqueue("test_length", self.tracks)
+        self.scheduler.enqueue("test_length", [self.tracks[1]], PRIORITY_PLAYING)
+        self.scheduler.boost([self.tracks[2].id], PRIORITY_PLAYING)
+        self.assertEqual([job[2] for job in self.scheduler._claim(3)], [2, 3, 1])
+
+    def test_jobs_of_deleted_tracks_are_dropped(self):
+        self.scheduler.enqueue("test_length", self.tracks)
+        self.library.delete_track(self.tracks[0].id)
+        self.scheduler.run(stop_when_idle=True)
+        self.assertEqual(sorted(saved), [(2, 6), (3, 7)])
+
+    def test_metadata_analyzer_updates_tags(self):
+        track = self.library.add_track(os.path.join(MUSIC_DIR, "silent-wood.mp3"), *UNKNOWN_METADATA.values())
+        self.scheduler.enqueue("metadata", [track])
+        self.scheduler.run(stop_when_idle=True)
+        self.assertEqual(self.library.get_track(track.id).artist, "Purrple Cat")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from db import init_db, make_sort_key
+from library import Library
+
+
+class TestLibrary(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+
+    def tearDown(self):
+        self.library.close()
+        self.temp_dir.cleanup()
+
+    def test_add_track_notifies_subscribers(self):
+        callback = MagicMock()
+        self.library.subscribe(callback)
+        track = self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        callback.assert_called_once_with("added", [track])
+        self.assertEqual(self.library.get_track_by_path("a.mp3"), track)
+
+    def test_duplicate_path_is_ignored(self):
+        self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        self.assertIsNone(self.library.add_track("a.mp3", "Artist", "Album", "Genre"))
+        self.assertEqual(len(self.library.all_tracks()), 1)
+
+    def test_changes_are_persisted(self):
+        track = self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        self.library.update_track(track.id, "New Artist", "Album", "Genre")
+        self.library.add_track("b.mp3", "Artist", "Album", "Genre")
+        self.library.delete_track(track.id)
+        reloaded = Library(self.db_path)
+        self.assertEqual([track.path for track in reloaded.all_tracks()], ["b.mp3"])
+        reloaded.close()
+
+    def test_update_tracks_in_one_operation(self):
+        first = self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        second = self.library.add_track("b.mp3", "Other", "Album", "Genre")
+        callback = MagicMock()
+        self.library.subscribe(callback)
+        tracks = self.library.update_tracks([first.id, second.id], album="Compilation")
+        self.assertEqual([track.album for track in tracks], ["Compilation", "Compilation"])
+        self.assertEqual([track.artist for track in tracks], ["Artist", "Other"])
+        callback.assert_called_once_with("updated", tracks)
+        self.assertEqual(len(self.library.search("compilation")), 2)
+        reloaded = Library(self.db_path)
+        self.assertEqual({track.album for track in reloaded.all_tracks()}, {"Compilation"})
+        reloaded.close()
+
+    def test_update_tracks_rejects_unknown_fields(self):
+        track = self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        with self.assertRaises(ValueError):
+            self.library.update_tracks([track.id], path="b.mp3")
+
+    def test_unsubscribe(self):
+        callback = MagicMock()
+        self.library.subscribe(callback)
+        self.library.unsubscribe(callback)
+        self.library.add_track("a.mp3", "Artist", "Album", "Genre")
+        callback.assert_not_called()
+
+    def test_search_is_case_insensitive(self):
+        self.library.add_track("a.mp3", "Artist", "Album", "Rock")
+        self.library.add_track("b.mp3", "Artist", "Album", "Jazz")
+        self.assertEqual([track.path for track in self.library.search("rOCK")], ["a.mp3"])
+
+    def test_facet_counts_follow_changes(self):
+        first = self.library.add_track("a.mp3", "Artist", "Album", "Rock")
+        second = self.library.add_track("b.mp3", "Artist", "Other Album", "Rock")
+        self.library.add_track("c.mp3", "Other", "Album", "Jazz")
+        self.library.update_tracks([second.id], genre="Jazz")
+        self.library.delete_track(first.id)
+
+        artists = self.library.list_facets("artist")
+        self.assertEqual([(artist.name, artist.track_count) for artist in artists], [("Artist", 1), ("Other", 1)])
+        self.assertEqual([(genre.name, genre.track_count) for genre in self.library.list_facets("genre")], [("Jazz", 2)])
+        albums = self.library.list_facets("album", artists[0].id)
+        self.assertEqual([album.name for album in albums], ["Other Album"])
+        self.assertEqual(self.library.facet_tracks("album", albums[0].id), [self.library.get_track(second.id)])
+        with self.assertRaises(ValueError):
+            self.library.list_facets("path")
+
+    def test_text_metadata_is_migrated(self):
+        self.library.close()
+        os.remove(self.db_path)
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "CREATE TABLE audio_history (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE, "
+            "artist TEXT, album TEXT, genre TEXT)"
+        )
+        connection.executemany(
+            "INSERT INTO audio_history (path, artist, album, genre) VALUES (?, ?, ?, ?)",
+            [("a.mp3", "Artist", "Album", "Rock"), ("b.mp3", "Artist", "Album", "Jazz")],
+        )
+        connection.commit()
+        connection.close()
+
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+
+        self.assertEqual(
+            [(track.id, track.artist, track.album, track.genre) for track in self.library.all_tracks()],
+            [(1, "Artist", "Album", "Rock"), (2, "Artist", "Album", "Jazz")],
+        )
+        self.assertEqual([album.track_count for album in self.library.list_facets("album")], [2])
+        self.assertEqual(self.library.add_track("c.mp3", "Artist", "Album", "Rock").id, 3)
+        self.assertEqual([track.display_name for track in self.library.all_tracks()], ["a", "b", "c"])
+
+    def test_display_names_for_windows_and_linux_paths(self):
+        windows = self.library.add_track("C:\\Music\\Song.One.mp3", None, None, None)
+        linux = self.library.add_track("/home/user/Music/Песня.flac", None, None, None)
+        no_extension = self.library.add_track("/music/README", None, None, None)
+        self.assertEqual(windows.display_name, "Song.One")
+        self.assertEqual(linux.display_name, "Песня")
+        self.assertEqual(no_extension.display_name, "README")
+        reloaded = Library(self.db_path)
+        self.assertEqual(reloaded.get_track(linux.id).display_name, "Песня")
+        reloaded.close()
+
+    def test_sorted_tracks_ignore_case_and_normalization(self):
+        beta = self.library.add_track("/music/b.mp3", "beta", None, None)
+        alpha = self.library.add_track("/music/a.mp3", "Alpha", None, None)
+        umlaut = self.library.add_track("/music/c.mp3", "A\u0308rger", None, None)
+        composed = self.library.add_track("/music/d.mp3", "\u00c4rger", None, None)
+        unknown = self.library.add_track("/music/e.mp3", None, None, None)
+        self.assertEqual(
+            [track.id for track in self.library.sorted_tracks("artist")],
+            [unknown.id, alpha.id, umlaut.id, composed.id, beta.id],
+        )
+        self.assertEqual(
+            sorted(["Émile", "Zappa", "Ärger", "Beta"], key=make_sort_key), ["Ärger", "Beta", "Émile", "Zappa"]
+        )
+        self.library.update_track(beta.id, "aardvark", None, None)
+        self.assertEqual(self.library.sorted_tracks("artist")[1].id, beta.id)
+        with self.assertRaises(ValueError):
+            self.library.sorted_tracks("path")
+
+    def test_facets_are_sorted_by_sort_key(self):
+        for number, artist in enumerate(["Émile", "Zappa", "Ärger", "beta"]):
+            self.library.add_track(f"/music/{number}.mp3", artist, None, None)
+        expected = ["Ärger", "beta", "Émile", "Zappa"]
+        self.assertEqual([artist.name for artist in self.library.list_facets("artist")], expected)
+
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("UPDATE artists SET sort_key = NULL")
+        connection.commit()
+        connection.close()
+        init_db(self.db_path)
+        reloaded = Library(self.db_path)
+        self.assertEqual([artist.name for artist in reloaded.list_facets("artist")], expected)
+        reloaded.close()
+
+    def test_session_state_round_trip(self):
+        self.assertEqual(self.library.load_session_state("client"), {})
+        self.library.save_session_state("client", {"track_id": 1, "position": 1500})
+        self.library.save_session_state("client", {"track_id": 2, "position": 0})
+        self.library.save_session_state("other", {"track_id": 1, "position": 700})
+        reloaded = Library(self.db_path)
+        self.assertEqual(reloaded.load_session_state("client"), {"track_id": 2, "position": 0})
+        self.assertEqual(reloaded.load_session_state("other"), {"track_id": 1, "position": 700})
+        reloaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from load_test import OPERATION_WEIGHTS, format_report, percentile, run_load_test
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_concurrent_sessions(self):
+        report = run_load_test(db_path="missing.db", sessions=3, operations=10, tracks=50)
+        handled = sum(len(values) for values in report["latencies"].values())
+        failed = sum(report["locked"].values()) + sum(report["errors"].values())
+        self.assertEqual(handled + failed, 30)
+        self.assertEqual(report["errors"], {})
+        self.assertTrue(set(report["latencies"]) <= set(OPERATION_WEIGHTS))
+        self.assertGreater(report["memory_per_session"], 0)
+        self.assertIn("search", format_report(report))
+
+
+if __name__ == "__main__":
+    unittest.main()
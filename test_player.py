@@ -1,12 +1,30 @@
+import os
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+
+from analysis import SimilarityIndex
+from db import init_db
+from jobs import PRIORITY_PLAYING, JobScheduler
+from library import Library
 from player import AudioPlayer
 
 
 class TestAudioPlayer(unittest.TestCase):
     def setUp(self):
-        self.page_mock = MagicMock()
-        self.player = AudioPlayer(MagicMock())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(db_path)
+        self.library = Library(db_path)
+        self.scheduler = JobScheduler(self.library, db_path)
+        self.player = AudioPlayer(MagicMock(), library=self.library, scheduler=self.scheduler)
+
+    def tearDown(self):
+        if self.player.session_timer is not None:
+            self.player.session_timer.cancel()
+        self.scheduler.close()
+        self.library.close()
+        self.temp_dir.cleanup()
 
     def test_set_speed_025_positive(self):
         self.player.current_track = MagicMock()
@@ -41,5 +59,135 @@ class TestAudioPlayer(unittest.TestCase):
         with self.assertRaises(AttributeError):
             self.player.set_speed_075(None)
 
+    def test_play_similar_keeps_list_for_unanalyzable_track(self):
+        track = self.library.add_track("/music/a.mp3", "Artist", "Album", "Genre")
+        self.player.current_track_path = track.path
+        self.player.current_track_list.controls.append(MagicMock())
+        with patch("player.get_similarity_index", return_value=SimilarityIndex()):
+            self.player.play_similar(None)
+        self.assertEqual(len(self.player.current_track_list.controls), 1)
+
+
+def client_page(client_id):
+    page = MagicMock()
+    page.client_storage.get.return_value = client_id
+    return page
+
+
+class TestSessionState(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+        self.scheduler = JobScheduler(self.library, self.db_path)
+        self.patchers = [
+            patch("player.get_library", return_value=self.library),
+            patch("player.get_job_scheduler", return_value=self.scheduler),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.scheduler.close()
+        self.library.close()
+        self.temp_dir.cleanup()
+
+    def create_file(self, name):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb"):
+            pass
+        return path
+
+    def test_state_is_restored_on_start(self):
+        track = self.library.add_track(self.create_file("song.mp3"), "Artist", "Album", "Genre")
+        player = AudioPlayer(client_page("desktop"), db_path=self.db_path)
+        player.set_current_track_source(track.path)
+        player.current_position = 42000
+        player.current_track.playback_rate = 1.5
+        player.current_track.volume = 0.8
+        player.sort_column = "artist"
+        player.close()
+
+        restored = AudioPlayer(client_page("desktop"), load_library=False, db_path=self.db_path)
+        restored.current_track.seek = MagicMock()
+        self.assertIsNone(restored.library)
+        self.assertEqual(restored.current_track_path, track.path)
+        self.assertEqual(restored.current_track.src, track.path)
+        self.assertEqual(restored.current_track.playback_rate, 1.5)
+        self.assertEqual(restored.current_track.volume, 0.8)
+        self.assertEqual(restored.sort_column, "artist")
+        restored.on_track_loaded(None)
+        restored.current_track.seek.assert_called_once_with(42000)
+        restored.load_library()
+        restored.close()
+
+    def test_clients_keep_separate_state(self):
+        first = AudioPlayer(client_page("first"), db_path=self.db_path)
+        second = AudioPlayer(client_page("second"), db_path=self.db_path)
+        first.current_track.volume = 0.2
+        second.current_track.volume = 0.9
+        first.sort_column = "genre"
+        first.close()
+        second.close()
+
+        self.assertEqual(AudioPlayer(client_page("first"), load_library=False, db_path=self.db_path).current_track.volume, 0.2)
+        self.assertEqual(AudioPlayer(client_page("second"), load_library=False, db_path=self.db_path).sort_column, None)
+        self.assertEqual(self.library.load_session_state("first")["sort_column"], "genre")
+
+    def test_injected_scheduler_is_used(self):
+        track = self.library.add_track("/music/a.mp3", "Artist", "Album", "Genre")
+        scheduler = MagicMock()
+        with patch("player.get_job_scheduler", side_effect=AssertionError):
+            player = AudioPlayer(MagicMock(), library=self.library, scheduler=scheduler)
+            player.set_current_track_source(track.path)
+        scheduler.boost.assert_any_call([track.id], PRIORITY_PLAYING)
+        player.close()
+
+    def test_cleared_search_lists_all_tracks(self):
+        self.library.add_track("/music/a.mp3", "Artist", "Album", "Genre")
+        self.library.add_track("/music/b.mp3", "Other", "Album", "Genre")
+        player = AudioPlayer(MagicMock(), library=self.library, scheduler=self.scheduler)
+        player.search_bar.value = "Other"
+        player.search_by_metadata(None)
+        self.assertEqual(len(player.current_track_list.controls), 1)
+        player.search_bar.value = "O"
+        player.search_by_metadata(None)
+        self.assertEqual(len(player.current_track_list.controls), 1)
+        player.search_bar.value = "  "
+        player.search_by_metadata(None)
+        self.assertEqual(len(player.current_track_list.controls), 2)
+        player.close()
+
+    def test_completed_track_advances_in_shuffle_mode(self):
+        paths = [self.library.add_track(self.create_file(name), "Artist", "Album", "Genre").path for name in ("a.mp3", "b.mp3")]
+        player = AudioPlayer(MagicMock(), library=self.library, scheduler=self.scheduler)
+        player.current_track.update = player.current_track.play = MagicMock()
+        player.play_pause_button.update = player.shuffle_button.update = MagicMock()
+        player.toggle_shuffle(None)
+        player.play_selected_file(paths[0], "all_tracks_list")
+        player.state_changed(MagicMock(data="completed"))
+        self.assertEqual(player.current_track_path, paths[1])
+        self.assertEqual(self.library.play_count(self.library.get_track_by_path(paths[1]).id), 1)
+        player.close()
+
+    def test_shuffle_reaches_tracks_imported_after_start(self):
+        paths = [self.create_file(name) for name in ("a.mp3", "b.mp3")]
+        self.library.add_track(paths[0], "Artist", "Album", "Genre")
+        player = AudioPlayer(MagicMock(), library=self.library, scheduler=self.scheduler)
+        player.current_track.update = player.current_track.play = MagicMock()
+        player.play_pause_button.update = player.shuffle_button.update = MagicMock()
+        player.toggle_shuffle(None)
+        player.play_selected_file(paths[0], "all_tracks_list")
+        player.play_next(None)
+        self.assertEqual(player.current_track_path, paths[0])
+        self.library.add_track(paths[1], "Artist", "Album", "Genre")
+        player.play_next(None)
+        self.assertEqual(player.current_track_path, paths[1])
+        player.close()
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import os
+import struct
+import tempfile
+import unittest
+import wave
+
+from preview import PreviewStore, parse_wav_header, slice_wav
+
+
+def write_wav(path, frames, rate=8000, channels=2):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"".join(struct.pack("<hh", i % 32768, -(i % 32768)) for i in range(frames)))
+
+
+def slice_wav_from(original):
+    start = 44 + (8000 * 30 - 8000 * 10) // 2 * 4
+    return original[start : start + 8000 * 10 * 4]
+
+
+class TestPreview(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "track.wav")
+        write_wav(self.path, 8000 * 30)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_slice_is_taken_from_the_middle(self):
+        data = slice_wav(self.path, seconds=10)
+        channels, rate, block_align, bits, offset, size = parse_wav_header(data)
+        self.assertEqual((channels, rate, block_align, bits, offset), (2, 8000, 4, 16, 44))
+        self.assertEqual(size, 8000 * 10 * 4)
+        self.assertEqual(struct.unpack("<hh", data[44:48]), (80000 % 32768, -(80000 % 32768)))
+
+    def test_chunks_before_data_are_skipped(self):
+        with open(self.path, "rb") as file:
+            original = file.read()
+        extra = b"LIST" + struct.pack("<I", 3) + b"abc\x00"
+        patched = original[:36] + extra + original[36:]
+        patched = patched[:4] + struct.pack("<I", len(patched) - 8) + patched[8:]
+        with open(self.path, "wb") as file:
+            file.write(patched)
+        self.assertEqual(slice_wav(self.path, seconds=10)[44:], slice_wav_from(original))
+
+    def test_non_wav_file(self):
+        path = os.path.join(self.temp_dir.name, "track.mp3")
+        with open(path, "wb") as file:
+            file.write(b"ID3" + b"\x00" * 100)
+        self.assertIsNone(slice_wav(path))
+        self.assertIsNone(PreviewStore().get_base64(path))
+
+    def test_store_caches_slices(self):
+        store = PreviewStore(memory_limit=1024 * 1024)
+        first = store.get_base64(self.path)
+        self.assertEqual(len(store.memory_cache), 1)
+        self.assertIs(store.get_base64(self.path), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from library import Track
+from search_index import TrigramIndex, trigrams
+
+
+def make_track(track_id, path, artist="Unknown Artist", album="Unknown Album", genre="Unknown Genre"):
+    return Track(track_id, path, artist, album, genre, None)
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.add_track(make_track(1, "C:\\music\\one.mp3", artist="Metallica"))
+        self.index.add_track(make_track(2, "/home/user/music/two.mp3", artist="Megadeth"))
+        self.index.add_track(make_track(3, "C:\\music\\three.mp3", artist="Metallica", genre="Thrash"))
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Ab"), {"  a", " ab", "ab "})
+
+    def test_typo_tolerant_search(self):
+        self.assertEqual(sorted(self.index.search("metalica")), [1, 3])
+
+    def test_search_by_file_name(self):
+        self.assertEqual(self.index.search("two"), [2])
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.search("metallica", limit=1)), 1)
+
+    def test_remove_track(self):
+        self.index.remove_track(make_track(2, "/home/user/music/two.mp3", artist="Megadeth"))
+        self.assertEqual(self.index.search("megadeth"), [])
+
+    def test_update_track(self):
+        old_track = make_track(1, "C:\\music\\one.mp3", artist="Metallica")
+        self.index.update_track(old_track, old_track._replace(artist="Slayer"))
+        self.assertEqual(self.index.search("slayer"), [1])
+        self.assertEqual(self.index.search("metallica"), [3])
+
+    def test_empty_query(self):
+        self.assertEqual(self.index.search(""), [])
+
+    def test_short_query(self):
+        self.assertEqual(self.index.search("m"), [])
+        self.assertEqual(sorted(self.index.search("me")), [1, 2, 3])
+
+    def test_shorter_complete_matches_come_first(self):
+        index = TrigramIndex()
+        for track_id, album in enumerate(["Love Me Tender", "Lovely Day", "Love", "Love Story"]):
+            index.add_track(make_track(track_id, f"/music/{track_id}.mp3", album=album))
+        self.assertEqual(index.search("love", limit=2), [2, 3])
+
+    def test_candidate_limit(self):
+        self.assertEqual(sorted(self.index.search("metalica", max_candidates=1)), [1, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+from db import init_db
+from library import Library, Track
+from shuffle import MODE_AVOID_SAME_ARTIST, MODE_FAVOR_UNPLAYED, Permutation, Shuffler
+
+
+class TestPermutation(unittest.TestCase):
+    def test_covers_every_position_once(self):
+        for size in (0, 1, 2, 3, 5, 64, 1000, 1025):
+            self.assertEqual(sorted(Permutation(size, seed=size)), list(range(size)))
+
+    def test_same_seed_gives_same_order(self):
+        self.assertEqual(list(Permutation(500, seed=7)), list(Permutation(500, seed=7)))
+        self.assertNotEqual(list(Permutation(500, seed=7)), list(Permutation(500, seed=8)))
+
+    def test_order_is_not_sequential(self):
+        order = list(Permutation(1000, seed=1))
+        self.assertNotEqual(order, list(range(1000)))
+        parities = [position % 2 for position in order[:20]]
+        self.assertNotEqual(parities, [parities[0], 1 - parities[0]] * 10)
+
+
+class TestShuffler(unittest.TestCase):
+    def setUp(self):
+        self.tracks = [Track(i, f"/music/{i}.mp3", f"Artist {i % 3}", None, None) for i in range(30)]
+
+    def test_plays_every_track_once_per_pass(self):
+        shuffler = Shuffler(len(self.tracks), self.tracks.__getitem__, seed=1)
+        first_pass = [shuffler.next_track().id for _ in range(30)]
+        second_pass = [shuffler.next_track().id for _ in range(30)]
+        self.assertEqual(sorted(first_pass), list(range(30)))
+        self.assertEqual(sorted(second_pass), list(range(30)))
+
+    def test_skips_missing_and_skipped_tracks(self):
+        shuffler = Shuffler(40, lambda i: self.tracks[i] if i < 30 else None, seed=1)
+        played = {shuffler.next_track(lambda track: track.id < 10).id for _ in range(20)}
+        self.assertEqual(played, set(range(10, 30)))
+        self.assertIsNone(Shuffler(5, lambda i: None).next_track())
+
+    def test_avoid_same_artist(self):
+        shuffler = Shuffler(len(self.tracks), self.tracks.__getitem__, MODE_AVOID_SAME_ARTIST, seed=2)
+        order = [shuffler.next_track() for _ in range(24)]
+        for previous, track in zip(order, order[1:]):
+            self.assertNotEqual(previous.artist, track.artist)
+
+    def test_favor_unplayed(self):
+        play_counts = {i: 5 for i in range(20)}
+        shuffler = Shuffler(
+            len(self.tracks), self.tracks.__getitem__, MODE_FAVOR_UNPLAYED, lambda i: play_counts.get(i, 0), seed=3
+        )
+        first = [shuffler.next_track().id for _ in range(5)]
+        self.assertTrue(all(track_id >= 20 for track_id in first))
+
+
+class TestPlayCounts(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        init_db(self.db_path)
+        self.library = Library(self.db_path)
+
+    def tearDown(self):
+        self.library.close()
+        self.temp_dir.cleanup()
+
+    def test_record_play_persists(self):
+        track = self.library.add_track("/music/a.mp3", "Artist", "Album", "Genre")
+        self.library.record_play(track.id)
+        self.library.record_play(track.id)
+        self.assertEqual(self.library.play_count(track.id), 2)
+        self.assertEqual(self.library.max_track_id(), track.id)
+
+        reloaded = Library(self.db_path)
+        self.assertEqual(reloaded.play_count(track.id), 2)
+        reloaded.close()
+
+        self.library.delete_track(track.id)
+        self.assertEqual(self.library.play_count(track.id), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
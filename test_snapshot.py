@@ -0,0 +1,86 @@
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db import init_db
+from library import Library
+from snapshot import export_snapshot, restore_snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "audio_history.db")
+        self.snapshot_path = os.path.join(self.temp_dir.name, "library.snapshot")
+        init_db(self.db_path)
+        library = Library(self.db_path)
+        library.add_track("C:\\Music\\song.mp3", "Artist", "Альбом", "Genre")
+        library.close()
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("INSERT INTO playlists_history (playlist_name) VALUES ('Плейлист 1')")
+        connection.execute("INSERT INTO playlist_tracks (playlist_id, track_id) VALUES (1, 1)")
+        connection.execute("INSERT INTO track_features (track_id, vector) VALUES (1, ?)", (b"\x00\x01\x02",))
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip_with_path_remapping(self):
+        self.assertEqual(export_snapshot(self.snapshot_path, self.db_path), 7)
+        os.remove(self.db_path)
+        init_db(self.db_path)
+
+        restore_snapshot(self.snapshot_path, self.db_path, path_prefixes={"C:\\Music\\": "/home/user/music/"})
+
+        connection = sqlite3.connect(self.db_path)
+        self.assertEqual(
+            connection.execute(
+                "SELECT audio_history.id, path, albums.name, albums.track_count "
+                "FROM audio_history JOIN albums ON albums.id = audio_history.album_id"
+            ).fetchall(),
+            [(1, "/home/user/music/song.mp3", "Альбом", 1)],
+        )
+        self.assertEqual(connection.execute("SELECT playlist_id, track_id FROM playlist_tracks").fetchall(), [(1, 1)])
+        self.assertEqual(connection.execute("SELECT vector FROM track_features").fetchone()[0], b"\x00\x01\x02")
+        connection.close()
+
+    def test_restore_replaces_existing_rows(self):
+        export_snapshot(self.snapshot_path, self.db_path)
+        restore_snapshot(self.snapshot_path, self.db_path)
+        connection = sqlite3.connect(self.db_path)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM audio_history").fetchone()[0], 1)
+        connection.close()
+
+    def test_restore_snapshot_with_text_metadata(self):
+        header = {
+            "format": "audioplayer-snapshot",
+            "version": 1,
+            "tables": {"audio_history": ["id", "path", "artist", "album", "genre", "cover_hash", "status"]},
+        }
+        legacy_path = os.path.join(self.temp_dir.name, "legacy.snapshot")
+        with gzip.open(legacy_path, "wt", encoding="utf-8") as file:
+            file.write(json.dumps(header) + "\n")
+            file.write(json.dumps([0, 5, "a.mp3", "Artist", "Album", "Rock", None, None]) + "\n")
+            file.write(json.dumps([0, 6, "b.mp3", "Other", "Album", "Rock", None, None]) + "\n")
+
+        restore_snapshot(legacy_path, self.db_path)
+
+        library = Library(self.db_path)
+        self.assertEqual([track.artist for track in library.all_tracks()], ["Artist", "Other"])
+        self.assertEqual([(genre.name, genre.track_count) for genre in library.list_facets("genre")], [("Rock", 2)])
+        self.assertEqual([album.track_count for album in library.list_facets("album")], [1, 1])
+        library.close()
+
+    def test_invalid_snapshot(self):
+        with open(self.snapshot_path, "wb") as file:
+            file.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            restore_snapshot(self.snapshot_path, self.db_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.client import HTTPConnection
+
+from stream_server import AudioStreamServer, parse_range, start_stream_server, stop_stream_server, track_url
+
+
+class TestParseRange(unittest.TestCase):
+    def test_without_header(self):
+        self.assertIsNone(parse_range(None, 100))
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range("bytes=10-19", 100), (10, 19))
+
+    def test_open_range(self):
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+
+    def test_end_is_clamped_to_size(self):
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+
+    def test_unsatisfiable_range(self):
+        with self.assertRaises(ValueError):
+            parse_range("bytes=100-", 100)
+
+    def test_multiple_ranges_are_ignored(self):
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+
+
+class TestAudioStreamServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+        self.temp_file.write(bytes(range(100)))
+        self.temp_file.close()
+        paths = {1: self.temp_file.name}
+        self.server = AudioStreamServer(("127.0.0.1", 0), paths.get)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = HTTPConnection("127.0.0.1", self.server.server_address[1])
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.temp_file.name)
+
+    def request(self, path, headers=None):
+        self.connection.request("GET", path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_full_file(self):
+        response, body = self.request("/tracks/1")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, bytes(range(100)))
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+
+    def test_range_request(self):
+        response, body = self.request("/tracks/1", {"Range": "bytes=10-14"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, bytes(range(10, 15)))
+        self.assertEqual(response.getheader("Content-Range"), "bytes 10-14/100")
+
+    def test_not_modified(self):
+        response, _ = self.request("/tracks/1")
+        etag = response.getheader("ETag")
+        response, body = self.request("/tracks/1", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+
+    def test_unknown_track(self):
+        response, _ = self.request("/tracks/2")
+        self.assertEqual(response.status, 404)
+
+
+class TestStartStreamServer(unittest.TestCase):
+    def tearDown(self):
+        stop_stream_server()
+
+    def test_binds_to_localhost_by_default(self):
+        server = start_stream_server(port=0, path_resolver=lambda track_id: None)
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+        self.assertEqual(track_url(5), f"http://127.0.0.1:{server.server_address[1]}/tracks/5")
+
+
+if __name__ == "__main__":
+    unittest.main()